@@ -0,0 +1,27 @@
+class Achiever:
+    """ A ground action, or the no-op of a fact (action None), at one action level of the planning graph.
+
+    touched holds the preconditions and add effects, excluded the facts mutex with one of the preconditions at
+    that level, so the mutex test between two achievers is three set intersections.
+    """
+    __slots__ = ('action', 'preconditions', 'adds', 'touched', 'deleted', 'excluded')
+
+    def __init__(self, action, preconditions, adds, deleted, excluded):
+        self.action = action
+        self.preconditions = preconditions
+        self.adds = adds
+        self.touched = preconditions | adds
+        self.deleted = deleted
+        self.excluded = excluded
+
+    @classmethod
+    def noop(cls, fact, excluded):
+        facts = frozenset((fact,))
+        return cls(None, facts, facts, frozenset(), excluded)
+
+    def mutex(self, other):
+        """ One deletes a precondition or an add effect of the other (inconsistent effects, interference) or their
+        preconditions are mutex (competing needs) """
+        return not (self is other or (self.deleted.isdisjoint(other.touched) and
+                                      other.deleted.isdisjoint(self.touched) and
+                                      self.excluded.isdisjoint(other.preconditions)))
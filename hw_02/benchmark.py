@@ -0,0 +1,231 @@
+import gc
+import os
+import random
+import sys
+import tempfile
+import time
+
+from grounder import Grounder
+from pddl_parser import PddlParser
+from planner import Planner
+
+
+# a task whose one action must be grounded with both parameters equal: going from l1 to l1 visits it
+VISIT_DOMAIN = """(define (domain visit)
+  (:requirements :strips :typing)
+  (:types place)
+  (:predicates (at ?p - place) (visited ?p - place))
+  (:action go
+    :parameters (?f - place ?t - place)
+    :precondition (and (at ?f))
+    :effect (and (at ?t) (visited ?t) (not (at ?f)))))
+"""
+VISIT_PROBLEM = """(define (problem visit1) (:domain visit)
+  (:objects l1 - place)
+  (:init (at l1))
+  (:goal (and (visited l1))))
+"""
+
+
+def generate_depots_problem(filename, depots, distributors, trucks, pallets, hoists, crates, seed=0):
+    """ Writes a random solvable Depots problem (same domain as Depots.pddl) and returns its number of init
+    facts """
+    rnd = random.Random(seed)
+    places = ['depot%d' % i for i in range(depots)] + ['distributor%d' % i for i in range(distributors)]
+    init = []
+    # every pallet is a stack; crates are piled on random stacks
+    stack_top = {}
+    stack_place = {}
+    for i in range(pallets):
+        pallet = 'pallet%d' % i
+        place = places[i % len(places)]
+        init.append('(at %s %s)' % (pallet, place))
+        stack_top[pallet] = pallet
+        stack_place[pallet] = place
+    pallet_names = list(stack_top)
+    for i in range(crates):
+        crate = 'crate%d' % i
+        pallet = rnd.choice(pallet_names)
+        init.append('(at %s %s)' % (crate, stack_place[pallet]))
+        init.append('(on %s %s)' % (crate, stack_top[pallet]))
+        stack_top[pallet] = crate
+    for top in stack_top.values():
+        init.append('(clear %s)' % top)
+    for i in range(trucks):
+        init.append('(at truck%d %s)' % (i, rnd.choice(places)))
+    for i in range(hoists):
+        init.append('(at hoist%d %s)' % (i, places[i % len(places)]))
+        init.append('(available hoist%d)' % i)
+    # one goal crate per pallet, so the problem stays solvable
+    goals = ['(on crate%d pallet%d)' % (i, pallet) for i, pallet in enumerate(rnd.sample(range(pallets),
+                                                                                          min(crates, pallets)))]
+
+    with open(filename, 'w') as f:
+        f.write('(define (problem depotprob%d) (:domain Depot)\n(:objects\n' % seed)
+        f.write('\t%s - Depot\n' % ' '.join(places[:depots]))
+        f.write('\t%s - Distributor\n' % ' '.join(places[depots:]))
+        f.write('\t%s - Truck\n' % ' '.join('truck%d' % i for i in range(trucks)))
+        f.write('\t%s - Pallet\n' % ' '.join(pallet_names))
+        f.write('\t%s - Crate\n' % ' '.join('crate%d' % i for i in range(crates)))
+        f.write('\t%s - Hoist)\n' % ' '.join('hoist%d' % i for i in range(hoists)))
+        f.write('(:init\n\t%s\n)\n\n' % '\n\t'.join(init))
+        f.write('(:goal (and\n\t\t%s\n\t)\n))\n' % '\n\t\t'.join(goals))
+    return len(init)
+
+
+def benchmark_parser(sizes=(10000, 50000, 100000), repeat=3):
+    """ Times PddlParser on generated problems with (roughly) the given number of init facts """
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for size in sizes:
+            problem = os.path.join(tmp_dir, 'pfile_%d.pddl' % size)
+            # a crate contributes ~2 facts, pallets and hoists ~1.5 each
+            crates = size * 2 // 5
+            facts = generate_depots_problem(problem, depots=10, distributors=40, trucks=size // 100,
+                                            pallets=size // 20, hoists=size // 20, crates=crates)
+            best = None
+            for _ in range(repeat):
+                start = time.perf_counter()
+                parser = PddlParser()
+                parser.parse_domain('Depots.pddl')
+                parser.parse_problem(problem)
+                elapsed = time.perf_counter() - start
+                best = elapsed if best is None else min(best, elapsed)
+            print('parse {:>7} facts: {:.3f}s ({:.0f} facts/s)'.format(facts, best, facts / best))
+
+
+def benchmark_grounding(sizes=((2, 2, 2, 4, 4, 6), (3, 3, 4, 8, 8, 12), (4, 6, 6, 12, 12, 20))):
+    """ Compares ground action counts and times of the grounding modes; sizes are
+    (depots, distributors, trucks, pallets, hoists, crates) tuples """
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for size in sizes:
+            problem = os.path.join(tmp_dir, 'pfile.pddl')
+            generate_depots_problem(problem, *size)
+            parser = PddlParser()
+            parser.parse_domain('Depots.pddl')
+            parser.parse_problem(problem)
+            for mode in Grounder.MODES:
+                start = time.perf_counter()
+                ground_actions = Grounder(parser).ground(mode)
+                elapsed = time.perf_counter() - start
+                print('ground {} {:>9}: {:>8} actions, {:.3f}s ({:.1f}us per action)'.format(
+                    size, mode, len(ground_actions), elapsed, elapsed * 1e6 / max(len(ground_actions), 1)))
+
+
+def benchmark_mutexes(sizes=((2, 2, 2, 4, 4, 6), (3, 3, 4, 8, 8, 12), (4, 6, 6, 12, 12, 20)), pause_gc=False):
+    """ Replays the graph levels of generated problems through every mutex engine, timing update_mutexes and
+    checking that the engines find the same pairs; sizes as in benchmark_grounding. The 'matrix' engine needs the
+    optional numpy and scipy packages and is skipped without them.
+    pause_gc: turn the cyclic garbage collector off while the levels are replayed, as the millions of pair tuples
+    hold no cycles and the collector only rescans them
+    """
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        problem = os.path.join(tmp_dir, 'pfile.pddl')
+        for size in sizes:
+            generate_depots_problem(problem, *size)
+            graph = Planner('Depots.pddl', problem)
+            graph.expand_graph()
+            found = {}
+            for engine in Planner.MUTEX_ENGINES:
+                try:
+                    planner = Planner('Depots.pddl', problem, mutex_engine=engine)
+                except ImportError as error:
+                    print('mutexes {} {:>6}: skipped, {}'.format(size, engine, error))
+                    continue
+                planner.states = graph.states
+                planner.action_state = graph.action_state
+                if pause_gc:
+                    gc.disable()
+                start = time.perf_counter()
+                for level in sorted(graph.action_state):
+                    planner.update_mutexes(level)
+                elapsed = time.perf_counter() - start
+                if pause_gc:
+                    gc.enable()
+                if planner.mutex_engine:
+                    planner.mutex_engine.close()
+                # ground actions of different planners only compare by id
+                found[engine] = [{tuple(getattr(item, 'id', item) for item in pair) for pair in mutexes[level]}
+                                 for mutexes in (planner.inconsistent_effects, planner.interference)
+                                 for level in graph.action_state]
+                print('mutexes {} {:>6}: {:>8} pairs, {:.3f}s'.format(
+                    size, engine, sum(len(pairs) for pairs in found[engine]), elapsed))
+                if found[engine] != found[Planner.MUTEX_ENGINES[0]]:
+                    raise Exception('Mutex engine ' + engine + ' disagrees on ' + str(size))
+
+def benchmark_expansion(sizes=((2, 2, 2, 4, 4, 6), (3, 3, 4, 8, 8, 12)), workers=None):
+    """ Times expand_graph without reports with the serial fact mutex checks and with the 'parallel' mutex engine
+    checking them in tiles, and checks that both find the same fact mutexes; sizes as in benchmark_grounding """
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        problem = os.path.join(tmp_dir, 'pfile.pddl')
+        for size in sizes:
+            generate_depots_problem(problem, *size)
+            found = {}
+            for engine in ('index', 'parallel'):
+                planner = Planner('Depots.pddl', problem, mutex_engine=engine, workers=workers)
+                start = time.perf_counter()
+                planner.expand_graph()
+                elapsed = time.perf_counter() - start
+                found[engine] = planner.inconsistent_support
+                print('expand {} {:>8}: {} levels, {:>8} fact mutexes, {:.3f}s'.format(
+                    size, engine, len(planner.states), sum(len(pairs) for pairs in found[engine].values()), elapsed))
+            if found['parallel'] != found['index']:
+                raise Exception('The parallel fact mutexes disagree on ' + str(size))
+
+def benchmark_extraction(sizes=((2, 2, 2, 4, 4, 6), (3, 3, 4, 8, 8, 12)), budget=100000):
+    """ Times extract_plan after expand_graph, giving up after trying budget achievers, prints the extraction
+    statistics and checks that a found plan reaches the goals; sizes as in benchmark_grounding """
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        problem = os.path.join(tmp_dir, 'pfile.pddl')
+        for size in sizes:
+            generate_depots_problem(problem, *size)
+            planner = Planner('Depots.pddl', problem, extraction_budget=budget)
+            planner.expand_graph()
+            plan = planner.extract_plan()
+            statistics = planner.extraction_statistics()
+            found = 'no plan' if plan is None else '{} steps'.format(len(plan))
+            print('extract {}: {}, {} searches, {} achievers tried, {} nogood hits, {} conflict hits, {} conflicts, '
+                  '{:.3f}s{}'.format(size, found, statistics['searches'], statistics['steps'],
+                                     statistics['nogood_hits'], statistics['conflict_hits'], statistics['conflicts'],
+                                     statistics['extraction_time'], '' if not statistics['budget_spent'] else
+                                     ', budget spent'))
+            if plan is None:
+                continue
+            state = set(planner.parser.init_facts)
+            for step in plan:
+                if not all(action.pre_set <= state for action in step):
+                    raise Exception('The plan extracted on ' + str(size) + ' is not applicable')
+                state = (state - set().union(*(action.del_set for action in step))) | set().union(
+                    *(action.add_set for action in step))
+            if not set(planner.parser.positive_goal_facts) <= state:
+                raise Exception('The plan extracted on ' + str(size) + ' misses the goals')
+
+
+def check_equal_parameters():
+    """ Checks that an action grounding with equal parameters is only excluded when it changes nothing, by
+    planning the one place visit task in both grounding modes """
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        domain = os.path.join(tmp_dir, 'domain.pddl')
+        problem = os.path.join(tmp_dir, 'problem.pddl')
+        for filename, text in ((domain, VISIT_DOMAIN), (problem, VISIT_PROBLEM)):
+            with open(filename, 'w') as f:
+                f.write(text)
+        for mode in Grounder.MODES:
+            planner = Planner(domain, problem, grounding=mode)
+            if planner.graph_plan() is None:
+                raise Exception('No plan found for the visit task with ' + mode + ' grounding')
+            print('equal parameters {:>9}: {} ground actions, plan found'.format(
+                mode, len(planner.all_possible_actions)))
+
+
+
+if __name__ == '__main__':
+    benchmarks = {
+        'equal_parameters': check_equal_parameters,
+        'parser': benchmark_parser,
+        'grounding': benchmark_grounding,
+        'mutexes': benchmark_mutexes,
+        'expansion': benchmark_expansion,
+        'extraction': benchmark_extraction,
+    }
+    for name in sys.argv[1:] or benchmarks:
+        benchmarks[name]()
@@ -0,0 +1,24 @@
+""" Sets of fact ids stored as Python int bitsets: bit i is set when id i is in the set """
+
+# the set bit positions of every byte value
+_BYTE_BITS = [tuple(bit for bit in range(8) if value >> bit & 1) for value in range(256)]
+
+
+def to_bitset(ids):
+    ids = list(ids)
+    if not ids:
+        return 0
+    data = bytearray(max(ids) // 8 + 1)
+    for i in ids:
+        data[i >> 3] |= 1 << (i & 7)
+    return int.from_bytes(data, 'little')
+
+
+def bitset_ids(bitset):
+    """ The ids of the set bits, in increasing order """
+    data = bitset.to_bytes((bitset.bit_length() + 7) // 8, 'little')
+    return [8 * index + bit for index, value in enumerate(data) if value for bit in _BYTE_BITS[value]]
+
+
+def has_bit(bitset, i):
+    return bitset >> i & 1 == 1
@@ -0,0 +1,43 @@
+from bitset import bitset_ids, has_bit, to_bitset
+
+
+class FactLayer:
+    """ One fact level of the planning graph as two int bitsets over fact ids: the facts that hold and the facts
+    an action of an earlier level deleted. Iterating it yields literals, fact ids and ~fact_id for the deleted """
+    __slots__ = ('facts', 'deleted')
+
+    def __init__(self, facts=0, deleted=0):
+        self.facts = facts
+        self.deleted = deleted
+
+    @classmethod
+    def from_facts(cls, facts):
+        return cls(to_bitset(facts))
+
+    def expand(self, add_effects, del_effects):
+        """ The next layer: this one plus the given added and deleted fact ids """
+        return FactLayer(self.facts | to_bitset(add_effects), self.deleted | to_bitset(del_effects))
+
+    def new_facts(self, previous):
+        """ Ids of the facts that hold here but not in the previous layer """
+        return bitset_ids(self.facts & ~previous.facts)
+
+    def both_polarities(self):
+        """ Ids of the facts that appear both positive and negated """
+        return bitset_ids(self.facts & self.deleted)
+
+    def __contains__(self, literal):
+        if literal < 0:
+            return has_bit(self.deleted, ~literal)
+        return has_bit(self.facts, literal)
+
+    def __iter__(self):
+        yield from bitset_ids(self.facts)
+        for fact in bitset_ids(self.deleted):
+            yield ~fact
+
+    def __len__(self):
+        return self.facts.bit_count() + self.deleted.bit_count()
+
+    def __eq__(self, other):
+        return self.facts == other.facts and self.deleted == other.deleted
@@ -0,0 +1,87 @@
+import hashlib
+import os
+import pickle
+
+# Bump whenever the header or level record layout, or the ground action order, changes so old checkpoints are
+# started over
+CHECKPOINT_VERSION = 2
+
+
+class GraphCheckpoint:
+    """ Append only file of the finished planning graph levels: a header, then one pickled record per level.
+
+    The task key covers the domain, the objects, the init facts and the grounding mode but not the goals, so a
+    checkpoint is reused when only the goals change. As the goals can shift the fact ids the parser gives, the
+    header keeps the name of every fact id and the records are translated to the current ids on load.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.file = None
+
+    @staticmethod
+    def key(domain_filename, parser, grounding):
+        digest = hashlib.sha256(('v%d %r' % (CHECKPOINT_VERSION, grounding)).encode())
+        with open(domain_filename, 'rb') as f:
+            digest.update(hashlib.sha256(f.read()).digest())
+        symbols = parser.symbols
+        digest.update(repr(sorted((type_name, sorted(objects)) for type_name, objects in parser.objects.items()))
+                      .encode())
+        digest.update(repr(sorted(symbols.fact_name(fact) for fact in parser.init_facts)).encode())
+        return digest.hexdigest()
+
+    def resume(self, key, symbols, action_count):
+        """ Returns the level records saved for the task, with the current fact ids, and opens the file to append
+        the next ones; a checkpoint of another task is started over and a partly written last record dropped """
+        header = {'key': key, 'action_count': action_count,
+                  'facts': [symbols.fact_name(fact) for fact in range(len(symbols))]}
+        records = []
+        end = None
+        try:
+            with open(self.path, 'rb') as f:
+                saved_header = pickle.load(f)
+                if saved_header['key'] == key and saved_header['action_count'] == action_count:
+                    header = saved_header
+                    end = f.tell()
+                    while True:
+                        records.append(pickle.load(f))
+                        end = f.tell()
+        except (OSError, EOFError, pickle.UnpicklingError):
+            pass
+        if end is None:
+            records = []
+            self.file = open(self.path, 'wb')
+            pickle.dump(header, self.file, protocol=pickle.HIGHEST_PROTOCOL)
+            self.__flush()
+        else:
+            self.file = open(self.path, 'r+b')
+            self.file.truncate(end)
+            self.file.seek(end)
+        return [self.__translate(record, [symbols.fact(name) for name in header['facts']]) for record in records]
+
+    def append(self, record):
+        pickle.dump(record, self.file, protocol=pickle.HIGHEST_PROTOCOL)
+        self.__flush()
+
+    def close(self):
+        if self.file:
+            self.file.close()
+            self.file = None
+
+    def __flush(self):
+        # a finished level must survive the run dying right after it
+        self.file.flush()
+        os.fsync(self.file.fileno())
+
+    @staticmethod
+    def __translate(record, fact_ids):
+        """ The record with the saved fact ids replaced by fact_ids[saved id] """
+        if all(fact == fact_id for fact, fact_id in enumerate(fact_ids)):
+            return record
+        record = dict(record)
+        for field in ('facts', 'deleted'):
+            record[field] = [fact_ids[fact] for fact in record[field]]
+        record['effect_facts'] = [(action_id, fact_ids[fact]) for action_id, fact in record['effect_facts']]
+        record['fact_mutexes'] = [(fact_ids[fact_1], fact_ids[fact_2]) if fact_ids[fact_1] < fact_ids[fact_2] else
+                                  (fact_ids[fact_2], fact_ids[fact_1]) for fact_1, fact_2 in record['fact_mutexes']]
+        return record
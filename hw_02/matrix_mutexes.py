@@ -0,0 +1,79 @@
+import numpy as np
+from scipy import sparse
+
+
+class MatrixMutexes:
+    """ Inconsistent effects and interference mutexes as boolean products of sparse action x fact incidence
+    matrices (deleted, added and precondition facts). Needs numpy and scipy.
+
+    Rows are the ground action ids, columns the fact ids. For the actions new at a level, new x current action
+    pairs with a shared fact are the non zero entries of e.g. deletes[new] @ adds[current].T
+    """
+
+    def __init__(self, actions, fact_count):
+        self.actions = actions
+        self.fact_count = fact_count
+        # the ground actions by id, to pick the actions of many ids at once
+        self.action_objects = np.empty(len(actions), dtype=object)
+        self.action_objects[:] = actions
+        self.deletes = self.__incidence(actions, 'del_effects', fact_count)
+        self.adds = self.__incidence(actions, 'add_effects', fact_count)
+        self.requires = self.__incidence(actions, 'positive_preconditions', fact_count)
+        self.active = np.zeros(len(actions), dtype=bool)  # the actions already in the graph
+
+    @staticmethod
+    def __incidence(actions, field, fact_count):
+        rows = [action.id for action in actions for _ in getattr(action, field)]
+        columns = [fact for action in actions for fact in getattr(action, field)]
+        return sparse.csr_matrix((np.ones(len(rows), dtype=np.int32), (rows, columns)),
+                                 shape=(len(actions), fact_count))
+
+    def activate(self, new_actions):
+        """ Marks the actions entering the graph """
+        self.active[[action.id for action in new_actions]] = True
+
+    def level_mutexes(self, new_actions, layer, previous_layer):
+        """ The inconsistent effects and interference pairs that first appear with new_actions, in the same form
+        as Planner's: action pairs ordered by id and (action, fact) pairs. new_actions must be activated first """
+        new = np.array(sorted(action.id for action in new_actions), dtype=np.int64)
+        current = np.flatnonzero(self.active)
+        deletes_new, adds_new, requires_new = self.deletes[new], self.adds[new], self.requires[new]
+        deletes_current = self.deletes[current]
+
+        inconsistent_effects = self.__action_pairs(
+            deletes_new @ self.adds[current].T + adds_new @ deletes_current.T, new, current)
+        # a new action deleting a fact of the layer, an older one deleting a fact new to this layer
+        for rows, matrix, facts in ((new, deletes_new, layer.facts),
+                                    (current, deletes_current, layer.facts & ~previous_layer.facts)):
+            fact_ids = np.flatnonzero(self.__fact_mask(facts))
+            action_rows, fact_columns = matrix[:, fact_ids].nonzero()
+            inconsistent_effects.update(zip(self.action_objects[rows[action_rows]].tolist(),
+                                            fact_ids[fact_columns].tolist()))
+
+        interference = self.__action_pairs(
+            deletes_new @ self.requires[current].T + requires_new @ deletes_current.T, new, current)
+        return inconsistent_effects, interference
+
+    def close(self):
+        """ Nothing to release, the matrices are plain memory """
+
+    def __action_pairs(self, product, rows, columns):
+        """ The action pairs, ordered by id, of the non zero entries of product; the entries are ordered and
+        deduplicated as packed low * action count + high keys before any action pair is built """
+        product_rows, product_columns = product.nonzero()
+        ids_1 = rows[product_rows]
+        ids_2 = columns[product_columns]
+        low = np.minimum(ids_1, ids_2)
+        high = np.maximum(ids_1, ids_2)
+        distinct = low != high
+        keys = np.sort(low[distinct] * len(self.actions) + high[distinct])
+        if keys.size:
+            # sorted keys are unique where they differ from the previous one, cheaper than np.unique's hashing
+            keys = keys[np.concatenate(([True], keys[1:] != keys[:-1]))]
+        low, high = np.divmod(keys, len(self.actions))
+        return set(zip(self.action_objects[low].tolist(), self.action_objects[high].tolist()))
+
+    def __fact_mask(self, bitset):
+        """ 0/1 vector over the fact ids of a FactLayer bitset """
+        data = np.frombuffer(bitset.to_bytes((self.fact_count + 7) // 8, 'little'), dtype=np.uint8)
+        return np.unpackbits(data, bitorder='little')[:self.fact_count]
@@ -0,0 +1,204 @@
+import array
+import os
+import weakref
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+from achiever import Achiever
+from bitset import has_bit
+
+FIELDS = ('positive_preconditions', 'add_effects', 'del_effects')
+
+# worker process state, set by _attach and kept between tasks
+_memory = None
+_arrays = None
+_synced = 0  # the number of logged actions already indexed
+_indexes = None
+_level = None  # the fact mutex level last checked: (level, fact -> mutex facts, no-op facts, achievers by fact and id)
+
+
+class ParallelMutexes:
+    """ Inconsistent effects and interference mutexes, and the fact mutexes of the state levels, computed by a
+    process pool, each task taking one tile of the actions new at a level or of the fact pairs to check.
+
+    The preconditions and effects of the ground actions are copied once into shared memory as int32 arrays
+    (per field the offsets of every action, then the fact ids) followed by the log of the actions entering the
+    graph: their count, then their ids in the order they entered, so the workers only receive action and fact ids.
+    Every worker keeps its own fact -> deleting, adding and requiring actions indexes, extended before each task
+    with the ids logged since its previous one, and builds the achievers of the facts it checks once per level.
+    """
+
+    def __init__(self, actions, workers=None):
+        self.actions = actions
+        self.workers = workers or os.cpu_count() or 1
+        ints = []
+        layout = []
+        for field in FIELDS:
+            offsets = [0]
+            values = []
+            for action in actions:
+                values.extend(getattr(action, field))
+                offsets.append(len(values))
+            layout.append((len(ints), len(ints) + len(offsets)))
+            ints.extend(offsets)
+            ints.extend(values)
+        self.log_start = len(ints)
+        ints.extend([0] * (len(actions) + 1))
+        self.logged = 0
+        self.active = bytearray(len(actions))
+        self.memory = shared_memory.SharedMemory(create=True, size=4 * max(len(ints), 1))
+        self.memory.buf[:4 * len(ints)] = array.array('i', ints).tobytes()
+        self.array = self.memory.buf.cast('i')
+        self.executor = ProcessPoolExecutor(self.workers, initializer=_attach,
+                                            initargs=(self.memory.name, layout, self.log_start, len(actions)))
+        self.__finalizer = weakref.finalize(self, _release, self.executor, self.memory, self.array)
+
+    def activate(self, new_actions):
+        """ Logs the actions entering the graph, the workers index them before their next task """
+        for action in new_actions:
+            if not self.active[action.id]:
+                self.active[action.id] = 1
+                self.logged += 1
+                self.array[self.log_start + self.logged] = action.id
+        # the count goes last, a worker never reads an id that is not written yet
+        self.array[self.log_start] = self.logged
+
+    def level_mutexes(self, new_actions, layer, previous_layer):
+        """ The inconsistent effects and interference pairs that first appear with new_actions, in the same form
+        as Planner's: action pairs ordered by id and (action, fact) pairs. new_actions must be activated first """
+        new_ids = sorted(action.id for action in new_actions)
+        new_facts = layer.new_facts(previous_layer)
+        tiles = self.workers * 4
+        futures = [self.executor.submit(_level_tile, new_ids[tile::tiles], layer.facts, new_facts[tile::tiles])
+                   for tile in range(tiles)]
+        inconsistent_effects = set()
+        interference = set()
+        for future in futures:
+            effect_pairs, effect_facts, interference_pairs = future.result()
+            inconsistent_effects.update((self.actions[id_1], self.actions[id_2]) for id_1, id_2 in effect_pairs)
+            inconsistent_effects.update((self.actions[action_id], fact) for action_id, fact in effect_facts)
+            interference.update((self.actions[id_1], self.actions[id_2]) for id_1, id_2 in interference_pairs)
+        return inconsistent_effects, interference
+
+    def fact_mutexes(self, action_level, fact_mutexes, facts, candidates):
+        """ The candidate fact pairs whose achievers at action_level, no-ops included, are all pairwise mutex;
+        fact_mutexes are the fact mutex pairs of the action level and facts its fact bitset. The actions of the level
+        must be activated first """
+        candidates = list(candidates)
+        fact_mutexes = list(fact_mutexes)
+        tiles = self.workers * 4
+        futures = [self.executor.submit(_fact_mutex_tile, action_level, fact_mutexes, facts, candidates[tile::tiles])
+                   for tile in range(tiles)]
+        mutexes = set()
+        for future in futures:
+            mutexes.update(future.result())
+        return mutexes
+
+    def close(self):
+        """ Stops the workers and frees the shared memory """
+        self.__finalizer()
+
+
+def _release(executor, memory, view):
+    executor.shutdown()
+    view.release()
+    memory.close()
+    memory.unlink()
+
+
+def _attach(name, layout, log_start, action_count):
+    global _memory, _arrays, _synced, _indexes
+    _memory = shared_memory.SharedMemory(name=name)
+    ints = _memory.buf.cast('i')
+    _arrays = ([(ints[offsets_start:values_start], ints[values_start:]) for offsets_start, values_start in layout],
+               ints[log_start:log_start + action_count + 1])
+    _synced = 0
+    _indexes = ({}, {}, {})  # fact id -> requiring, adding, deleting action ids
+
+
+def _facts(action_id, field):
+    offsets, values = _arrays[0][field]
+    return values[offsets[action_id]:offsets[action_id + 1]].tolist()
+
+
+def _sync_indexes():
+    """ Indexes the actions logged since the last task of this worker """
+    global _synced
+    log = _arrays[1]
+    logged = log[0]
+    for action_id in log[1 + _synced:1 + logged].tolist():
+        for field, index in enumerate(_indexes):
+            for fact in _facts(action_id, field):
+                index.setdefault(fact, []).append(action_id)
+    _synced = logged
+
+
+def _level_tile(new_ids, layer_facts, new_facts):
+    """ The mutex pairs of one tile as ids: inconsistent effects action pairs and (action, fact) pairs, and
+    interference action pairs """
+    _sync_indexes()
+    requirers, adders, deleters = _indexes
+    effect_pairs = set()
+    effect_facts = set()
+    interference_pairs = set()
+    for action_id in new_ids:
+        preconditions, adds, deletes = (_facts(action_id, field) for field in range(len(FIELDS)))
+        for fact in deletes:
+            _add_pairs(effect_pairs, action_id, adders.get(fact, ()))
+            _add_pairs(interference_pairs, action_id, requirers.get(fact, ()))
+            if has_bit(layer_facts, fact):
+                effect_facts.add((action_id, fact))
+        for fact in adds:
+            _add_pairs(effect_pairs, action_id, deleters.get(fact, ()))
+        for fact in preconditions:
+            _add_pairs(interference_pairs, action_id, deleters.get(fact, ()))
+    # older actions deleting a fact that is new in this level
+    for fact in new_facts:
+        for action_id in deleters.get(fact, ()):
+            effect_facts.add((action_id, fact))
+    return list(effect_pairs), list(effect_facts), list(interference_pairs)
+
+
+def _fact_mutex_tile(action_level, fact_mutexes, facts, candidates):
+    """ The candidate fact pairs of one tile whose achievers are all pairwise mutex """
+    global _level
+    _sync_indexes()
+    if _level is None or _level[0] != action_level:
+        mutex_with = {}
+        for fact_1, fact_2 in fact_mutexes:
+            mutex_with.setdefault(fact_1, set()).add(fact_2)
+            mutex_with.setdefault(fact_2, set()).add(fact_1)
+        _level = (action_level, mutex_with, facts, {}, {})
+    mutexes = []
+    for fact_1, fact_2 in candidates:
+        achievers_2 = _achievers(fact_2)
+        if all(achiever_1.mutex(achiever_2) for achiever_1 in _achievers(fact_1) for achiever_2 in achievers_2):
+            mutexes.append((fact_1, fact_2))
+    return mutexes
+
+
+def _achievers(fact):
+    """ The Achievers of fact at the level being checked, its no-op first; an action achiever holds the action
+    id """
+    _, mutex_with, facts, by_fact, by_action = _level
+    achievers = by_fact.get(fact)
+    if achievers is None:
+        achievers = [Achiever.noop(fact, mutex_with.get(fact, frozenset()))] if has_bit(facts, fact) else []
+        for action_id in _indexes[1].get(fact, ()):
+            achiever = by_action.get(action_id)
+            if achiever is None:
+                preconditions, adds, deletes = (frozenset(_facts(action_id, field)) for field in range(len(FIELDS)))
+                achiever = by_action[action_id] = Achiever(
+                    action_id, preconditions, adds, deletes,
+                    set().union(*(mutex_with.get(precondition, ()) for precondition in preconditions)))
+            achievers.append(achiever)
+        by_fact[fact] = achievers
+    return achievers
+
+
+def _add_pairs(pairs, action_id, others):
+    for other in others:
+        if other < action_id:
+            pairs.add((other, action_id))
+        elif other > action_id:
+            pairs.add((action_id, other))
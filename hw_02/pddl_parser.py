@@ -1,10 +1,11 @@
 import re
 
 from action import Action
+from symbol_table import SymbolTable
 
 
 class PddlParser:
-    SUPPORTED_REQUIREMENTS = [':strips', ':typing']
+    SUPPORTED_REQUIREMENTS = [':strips', ':typing', ':equality']
 
     def __init__(self):
         self.predicates = {}
@@ -16,7 +17,13 @@ class PddlParser:
         self.domain_name = 'unknown'
         self.problem_name = 'unknown'
         self.requirements = []
-        self.types = {}
+        self.types = {}  # type -> its direct subtypes
+        self.type_closure = {}  # type -> the type and all its transitive subtypes
+        # integer ids of the predicates, objects and ground facts
+        self.symbols = SymbolTable()
+        self.init_facts = []
+        self.positive_goal_facts = []
+        self.negative_goal_facts = []
 
     @staticmethod
     def __scan_tokens(filename):
@@ -47,36 +54,21 @@ class PddlParser:
 
     def parse_domain(self, domain_filename):
         tokens = self.__scan_tokens(domain_filename)
-        if type(tokens) is list and tokens.pop(0) == 'define':
-            while tokens:
-                group = tokens.pop(0)
-                t = group.pop(0)
+        if type(tokens) is list and tokens and tokens[0] == 'define':
+            for index in range(1, len(tokens)):
+                group = tokens[index]
+                t = group[0]
                 if t == 'domain':
-                    self.domain_name = group[0]
+                    self.domain_name = group[1]
                 elif t == ':requirements':
-                    for req in group:
+                    for req in group[1:]:
                         if req not in self.SUPPORTED_REQUIREMENTS:
                             raise Exception('Requirement ' + req + ' not supported')
-                    self.requirements = group
+                    self.requirements = group[1:]
                 elif t == ':predicates':
                     self.__parse_predicates(group)
                 elif t == ':types':
-                    __tmp_list = []
-                    __tmp_dict = {}
-                    for index, value in enumerate(group):
-                        if value != '-':
-                            if value in __tmp_dict and group[index - 1] == '-':
-                                continue
-                            __tmp_list.append(value)
-                            __tmp_dict[value] = []
-                        else:
-                            if group[index + 1] in __tmp_dict:
-                                __tmp_dict[group[index + 1]] += __tmp_list
-                            else:
-                                __tmp_dict[group[index + 1]] = __tmp_list
-                            __tmp_list = []
-                    # __tmp_dict['locatable'] += __tmp_dict['surface']
-                    self.types = __tmp_dict
+                    self.__parse_types(group)
                 elif t == ':action':
                     self.__parse_action(group)
                 else:
@@ -84,29 +76,68 @@ class PddlParser:
         else:
             raise Exception('File ' + domain_filename + ' does not match domain pattern')
 
+    def __parse_types(self, group):
+        untyped_types = []
+        types = iter(group)
+        next(types)  # ':types'
+        for t in types:
+            if t == '-':
+                if not untyped_types:
+                    raise Exception('Unexpected hyphen in types')
+                self.__add_subtypes(next(types), untyped_types)
+                untyped_types = []
+            else:
+                untyped_types.append(t)
+        if untyped_types:
+            self.__add_subtypes('object', untyped_types)
+        self.type_closure = {}
+        for type_name in self.types:
+            # iterative preorder walk, so the depth of the hierarchy is not bounded by the recursion limit
+            closure = []
+            seen = set()
+            stack = [type_name]
+            while stack:
+                subtype = stack.pop()
+                if subtype not in seen:
+                    seen.add(subtype)
+                    closure.append(subtype)
+                    stack.extend(reversed(self.types[subtype]))
+            self.type_closure[type_name] = closure
+
+    def __add_subtypes(self, type_name, subtypes):
+        self.types.setdefault(type_name, [])
+        for subtype in subtypes:
+            self.types.setdefault(subtype, [])
+            if subtype not in self.types[type_name]:
+                self.types[type_name].append(subtype)
+
     def __parse_predicates(self, group):
-        for pred in group:
-            predicate_name = pred.pop(0)
+        for index in range(1, len(group)):
+            pred = iter(group[index])
+            predicate_name = next(pred)
             if predicate_name in self.predicates:
                 raise Exception('Predicate ' + predicate_name + ' redefined')
+            self.symbols.predicate(predicate_name)
             arguments = {}
             untyped_variables = []
-            while pred:
-                t = pred.pop(0)
+            for t in pred:
                 if t == '-':
                     if not untyped_variables:
                         raise Exception('Unexpected hyphen in predicates')
-                    item_type = pred.pop(0)
-                    while untyped_variables:
-                        arguments[untyped_variables.pop(0)] = item_type
+                    item_type = next(pred)
+                    for variable in untyped_variables:
+                        arguments[variable] = item_type
+                    untyped_variables = []
                 else:
                     untyped_variables.append(t)
-            while untyped_variables:
-                arguments[untyped_variables.pop(0)] = 'object'
+            for variable in untyped_variables:
+                arguments[variable] = 'object'
             self.predicates[predicate_name] = arguments
 
     def __parse_action(self, group):
-        name = group.pop(0)
+        group = iter(group)
+        next(group)  # ':action'
+        name = next(group, None)
         if not type(name) is str:
             raise Exception('Action without name definition')
         for act in self.actions:
@@ -117,41 +148,56 @@ class PddlParser:
         negative_preconditions = []
         add_effects = []
         del_effects = []
-        while group:
-            t = group.pop(0)
+        for t in group:
             if t == ':parameters':
-                if not type(group) is list:
+                p = next(group, None)
+                if not type(p) is list:
                     raise Exception('Error with ' + name + ' parameters')
                 parameters = []
                 untyped_parameters = []
-                p = group.pop(0)
-                while p:
-                    t = p.pop(0)
-                    if t == '-':
+                p = iter(p)
+                for t_parameter in p:
+                    if t_parameter == '-':
                         if not untyped_parameters:
                             raise Exception('Unexpected hyphen in ' + name + ' parameters')
-                        ptype = p.pop(0)
-                        while untyped_parameters:
-                            parameters.append([untyped_parameters.pop(0), ptype])
+                        ptype = next(p)
+                        for parameter in untyped_parameters:
+                            parameters.append([parameter, ptype])
+                        untyped_parameters = []
                     else:
-                        untyped_parameters.append(t)
-                while untyped_parameters:
-                    parameters.append([untyped_parameters.pop(0), 'object'])
+                        untyped_parameters.append(t_parameter)
+                for parameter in untyped_parameters:
+                    parameters.append([parameter, 'object'])
             elif t == ':precondition':
-                self.__split_predicates(group.pop(0), positive_preconditions, negative_preconditions, name,
-                                      ' preconditions')
+                self.__split_predicates(next(group, None), positive_preconditions, negative_preconditions, name,
+                                        ' preconditions')
             elif t == ':effect':
-                self.__split_predicates(group.pop(0), add_effects, del_effects, name, ' effects')
+                self.__split_predicates(next(group, None), add_effects, del_effects, name, ' effects')
             else:
                 print(str(t) + ' is not recognized in action')
+        # (= ?x ?y) and (not (= ?x ?y)) constrain the objects of parameters or constants, they are not facts
+        equal_parameters = self.__equalities(positive_preconditions, name)
+        distinct_parameters = self.__equalities(negative_preconditions, name)
         self.actions.append(
-            Action(name, parameters, positive_preconditions, negative_preconditions, add_effects, del_effects))
+            Action(name, parameters, positive_preconditions, negative_preconditions, add_effects, del_effects,
+                   distinct_parameters, equal_parameters))
+
+    @staticmethod
+    def __equalities(preconditions, name):
+        """ Removes the = atoms from preconditions and returns their (term, term) pairs """
+        pairs = []
+        for precondition in [precondition for precondition in preconditions if precondition[0] == '=']:
+            if len(precondition) != 3:
+                raise Exception('Unexpected equality in ' + name + ' preconditions')
+            pairs.append((precondition[1], precondition[2]))
+            preconditions.remove(precondition)
+        return pairs
 
     def parse_problem(self, problem_filename):
         tokens = self.__scan_tokens(problem_filename)
-        if type(tokens) is list and tokens.pop(0) == 'define':
-            while tokens:
-                group = tokens.pop(0)
+        if type(tokens) is list and tokens and tokens[0] == 'define':
+            for index in range(1, len(tokens)):
+                group = tokens[index]
                 t = group[0]
                 if t == 'problem':
                     self.problem_name = group[-1]
@@ -161,35 +207,34 @@ class PddlParser:
                 elif t == ':requirements':
                     pass  # Ignore requirements in problem, parse them in the domain
                 elif t == ':objects':
-                    group.pop(0)
+                    declared_objects = {}  # type -> the objects declared with exactly that type
                     object_list = []
-                    while group:
-                        if group[0] == '-':
-                            group.pop(0)
-                            self.objects[group.pop(0)] = object_list
+                    objects = iter(group)
+                    next(objects)  # ':objects'
+                    for obj in objects:
+                        if obj == '-':
+                            declared_objects.setdefault(next(objects), []).extend(object_list)
                             object_list = []
                         else:
-                            object_list.append(group.pop(0))
+                            self.symbols.object(obj)
+                            object_list.append(obj)
                     if object_list:
-                        if 'object' not in self.objects:
-                            self.objects['object'] = []
-                        self.objects['object'] += object_list
-                    for type_name, type_subtypes in self.types.items():
-                        if type_name == 'object':
-                            continue
-                        if type_name not in self.objects and type_subtypes != []:
-                            self.objects[type_name] = []
-                            for subtype in type_subtypes:
-                                if type_name == 'locatable' and subtype == 'surface':
-                                    for tmp_subtype in self.types[subtype]:
-                                        self.objects[type_name] += self.objects[tmp_subtype]
-                                else:
-                                    self.objects[type_name] += self.objects[subtype]
+                        declared_objects.setdefault('object', []).extend(object_list)
+                    # every type reads the objects of its whole subtree
+                    self.objects = {}
+                    for type_name in list(self.type_closure) + [type_name for type_name in declared_objects
+                                                                if type_name not in self.type_closure]:
+                        self.objects[type_name] = [obj for subtype in self.type_closure.get(type_name, [type_name])
+                                                   for obj in declared_objects.get(subtype, ())]
+                    self.objects['object'] = [obj for type_objects in declared_objects.values()
+                                              for obj in type_objects]
                 elif t == ':init':
-                    group.pop(0)
-                    self.state = group
+                    self.state = group[1:]
+                    self.init_facts = [self.symbols.fact(fact) for fact in self.state]
                 elif t == ':goal':
                     self.__split_predicates(group[1], self.positive_goals, self.negative_goals, '', 'goals')
+                    self.positive_goal_facts = [self.symbols.fact(goal) for goal in self.positive_goals]
+                    self.negative_goal_facts = [self.symbols.fact(goal) for goal in self.negative_goals]
                 else:
                     print(str(t) + ' is not recognized in problem')
         else:
@@ -200,7 +245,7 @@ class PddlParser:
         if not type(group) is list:
             raise Exception('Error with ' + name + part)
         if group[0] == 'and':
-            group.pop(0)
+            group = group[1:]
         else:
             group = [group]
         for predicate in group:
@@ -1,18 +1,64 @@
+import itertools
+import json
+import time
+
+from achiever import Achiever
+from action import GroundAction
+from bitset import bitset_ids, to_bitset
+from fact_layer import FactLayer
+from graph_checkpoint import GraphCheckpoint
+from grounder import Grounder
+from parallel_mutexes import ParallelMutexes
 from pddl_parser import PddlParser
+from symmetry import ObjectSymmetry
+from task_cache import TaskCache
 
 
 class Planner:
-    def __init__(self, domain_file_name, problem_file_name):
-        # Parser
-        self.parser = PddlParser()
-        self.parser.parse_domain(domain_file_name)
-        self.parser.parse_problem(problem_file_name)
+    MUTEX_ENGINES = ('index', 'matrix', 'parallel')
+    REPORT_FORMATS = ('text', 'jsonl')
+
+    def __init__(self, domain_file_name, problem_file_name, cache_dir=None, grounding='full', mutex_engine='index',
+                 reports=None, workers=None, checkpoint=None, symmetry=False, extraction_budget=None):
+        """ cache_dir: optional directory where parsed and grounded tasks are stored and reused between runs
+        grounding: 'full' grounds every typed object combination, 'reachable' only the relaxed reachable actions
+        mutex_engine: 'index' finds the action mutexes through fact indexes, 'matrix' through sparse matrix
+        products (needs numpy and scipy), 'parallel' through fact indexes in a pool of worker processes, which also
+        check the fact mutexes of every level in tiles. The action mutexes are only found for the reports and the
+        checkpoint, so 'matrix' only speeds those up
+        workers: the number of processes of the 'parallel' mutex engine, by default one per CPU
+        checkpoint: optional file where every finished graph level is saved; a planner given the file of an
+        interrupted run, or of a run on the same problem with other goals, resumes after its last saved level
+        symmetry: detect the orbits of interchangeable objects, then check one fact pair per orbit for mutexes and
+        share the nogoods of the goal sets the orbits map onto each other
+        extraction_budget: optional maximum number of achievers the plan extraction tries; once it is spent
+        extract_plan gives up and returns None, as extraction_statistics() tells
+        reports: None writes no reports, 'text' the readable .txt reports, 'jsonl' compact JSON lines .jsonl
+        reports that refer to facts and actions by id. The inconsistent effects and interference mutexes are only
+        computed for the reports and the checkpoint, the fact mutexes and plan extraction do without them
+        """
         self.action_state = {}  # An
         self.all_possible_actions = []
-        self.generate_all_available_actions()
-        self.possible_states = self.generate_all_possible_state_values()
-        self.states = {0: set(tuple(state) for state in self.parser.state)}
-        self.write_available_grounds()
+        cache = TaskCache(cache_dir) if cache_dir else None
+        cache_key = None
+        cached_task = None
+        if cache:
+            cache_key = cache.key(domain_file_name, problem_file_name, grounding)
+            cached_task = cache.load(cache_key)
+        if cached_task:
+            self.parser, self.all_possible_actions = cached_task
+        else:
+            # Parser
+            self.parser = PddlParser()
+            self.parser.parse_domain(domain_file_name)
+            self.parser.parse_problem(problem_file_name)
+            self.generate_all_available_actions(grounding)
+            if cache:
+                cache.store(cache_key, self.parser, self.all_possible_actions)
+        # fact layers hold fact ids, a deleted fact is added as its negated literal ~fact_id
+        self.states = {0: FactLayer.from_facts(self.parser.init_facts)}
+        # the inconsistent effects and interference mutexes are only recorded when record_mutexes is set, for the
+        # reports and the checkpoint; without them every level keeps an empty set
         self.inconsistent_effects = {
             'all_mutexes': set(),  # all mutexes that we found
             0: set()  # mutexes that we found in level 0
@@ -21,194 +67,657 @@ class Planner:
             'all_mutexes': set(),  # all mutexes that we found
             0: set()  # mutexes that we found in level 0
         }
+        # the facts of a level that no pair of achieving actions (or no-ops) of the previous level can support
+        # together; unlike the action mutexes above these are the full sets of each level, as they shrink.
+        # The competing needs of an action level follow from them, see competing_needs()
         self.inconsistent_support = {
-            'all_mutexes': set(),  # all mutexes that we found
-            0: set()  # mutexes that we found in level 0
+            0: set()  # fact id pairs, lower id first
         }
+        # fact id -> the actions of the graph so far that delete / add / require it
+        self.deleters_index = {}
+        self.adders_index = {}
+        self.requirers_index = {}
+        self.mutex_indexed_actions = set()
+        # plan extraction: level -> the goal sets that cannot be reached in that many levels, and the lookups
+        # and hits of these nogood tables
+        self.nogoods = {}
+        self.nogood_lookups = {}
+        self.nogood_hits = {}
+        self.__extraction_achievers = {}
+        # level -> fact -> the goal sets, smallest fact first, found to fail together at the level while assigning
+        # achievers: every goal set holding one of them fails there too
+        self.conflicts = {}
+        self.conflict_hits = 0
+        self.extraction_budget = extraction_budget
+        self.extraction_searches = 0
+        self.extraction_steps = 0
+        self.extraction_time = 0.0
+        self.__budget_spent = False
+        # the 'matrix' or 'parallel' engine; the matrix one is created with the first recorded action mutexes
+        self.mutex_engine = None
+        if mutex_engine == 'matrix':
+            # imported now, so a missing numpy or scipy fails here rather than at the first recorded level
+            import matrix_mutexes
+        elif mutex_engine == 'parallel':
+            self.mutex_engine = ParallelMutexes(self.all_possible_actions, workers)
+        elif mutex_engine != 'index':
+            raise Exception('Mutex engine ' + str(mutex_engine) + ' not supported')
+        self.mutex_engine_name = mutex_engine
+        if reports is not None and reports not in self.REPORT_FORMATS:
+            raise Exception('Report format ' + str(reports) + ' not supported')
+        self.reports = reports
+        self.checkpoint_file = checkpoint
+        self.record_mutexes = reports is not None or checkpoint is not None
+        self.checkpoint_key = GraphCheckpoint.key(domain_file_name, self.parser, grounding) if checkpoint else None
+        self.symmetry = None
+        if symmetry:
+            object_symmetry = ObjectSymmetry(self.parser)
+            # without interchangeable objects there is nothing to share
+            self.symmetry = object_symmetry if len(object_symmetry) else None
 
-    def generate_all_available_actions(self):
-        for action in self.parser.actions:
-            for possible_act in action.groundify(self.parser.objects):
-                self.all_possible_actions.append(possible_act)
+    def generate_all_available_actions(self, grounding='full'):
+        self.all_possible_actions = Grounder(self.parser).ground(grounding)
 
     def generate_all_possible_state_values(self):
         __states = {}
         for state, state_parameters in self.parser.predicates.items():
-            __states[state] = []
-            if len(state_parameters) == 1:
-                __states[state] = self.parser.objects[state_parameters[list(state_parameters.keys())[0]]]
+            typed_objects = [self.parser.objects[var_type] for var_type in state_parameters.values()]
+            if len(typed_objects) == 1:
+                __states[state] = typed_objects[0]
             else:
-                tmp_list_1 = self.parser.objects[state_parameters[list(state_parameters.keys())[0]]]
-                tmp_list_2 = self.parser.objects[state_parameters[list(state_parameters.keys())[1]]]
-                __states[state] = [(x, y) for x in tmp_list_1 for y in tmp_list_2 if x != y]
+                __states[state] = (values for values in itertools.product(*typed_objects)
+                                   if len(set(values)) == len(values))
         return __states
 
-    def write_available_grounds(self):
+    def write_reports(self, last_state_level):
+        """ Writes the ground facts and actions, graph levels and mutexes reports in the working directory,
+        streamed item by item in the reports format """
+        if self.reports == 'jsonl':
+            writers = (self.write_available_grounds_jsonl, self.write_actions_states_occurred_jsonl,
+                       self.write_mutexes_jsonl)
+            extension = '.jsonl'
+        else:
+            writers = (self.write_available_grounds, self.write_actions_states_occurred, self.write_mutexes)
+            extension = '.txt'
+        with open('ground_facts_actions' + extension, 'w') as f:
+            writers[0](f)
+        with open('graphPlan_states_actions' + extension, 'w') as f:
+            writers[1](f, last_state_level)
+        with open('graphPlan_mutexes' + extension, 'w') as f:
+            writers[2](f)
+
+    def write_available_grounds(self, f):
         # write ground facts
-        data = 'Ground facts: \n' + '-' * 50 + '\n'
-        for fact_type, facts in self.possible_states.items():
+        f.write('Ground facts: \n' + '-' * 50 + '\n')
+        for fact_type, facts in self.generate_all_possible_state_values().items():
             for fact in facts:
                 if type(fact) == list:
-                    data += "%s %s \n" % (fact_type, ', '.join(fact))
-                    data += "not %s %s \n" % (fact_type, ', '.join(fact))
+                    f.write("%s %s \n" % (fact_type, ', '.join(fact)))
+                    f.write("not %s %s \n" % (fact_type, ', '.join(fact)))
                 else:
-                    data += "%s %s \n" % (fact_type, fact)
-                    data += "not %s %s \n" % (fact_type, fact)
-        with open('ground_facts_actions.txt', 'w') as f:
-            f.write(data)
+                    f.write("%s %s \n" % (fact_type, fact))
+                    f.write("not %s %s \n" % (fact_type, fact))
 
         # write ground actions
-        data = 'Ground actions: \n' + '-' * 50 + '\n'
+        f.write('Ground actions: \n' + '-' * 50 + '\n')
+        for action in self.all_possible_actions:
+            f.write(action.describe(self.parser.symbols))
+
+    def write_available_grounds_jsonl(self, f):
+        """ One line per interned fact and per ground action, which the other jsonl reports refer to by id """
+        symbols = self.parser.symbols
+        for fact in range(len(symbols)):
+            self.__write_json(f, {'fact': fact, 'atom': symbols.fact_name(fact)})
         for action in self.all_possible_actions:
-            data += action.__str__()
-        with open('ground_facts_actions.txt', 'a') as f:
-            f.write(data)
+            self.__write_json(f, {'action': action.id, 'name': action.name,
+                                  'parameters': [symbols.object_name(obj) for obj in action.parameters],
+                                  'positive_preconditions': action.positive_preconditions,
+                                  'negative_preconditions': action.negative_preconditions,
+                                  'add_effects': action.add_effects, 'del_effects': action.del_effects})
 
     @staticmethod
     def applicable(state, precondition):
-        return tuple(precondition) in state
+        return precondition in state
+
+    def build_precondition_index(self):
+        """ fact id -> the ground actions that have it as a positive precondition """
+        precondition_index = {}
+        for action in self.all_possible_actions:
+            for precondition in action.pre_set:
+                precondition_index.setdefault(precondition, []).append(action)
+        return precondition_index
 
     def graph_plan(self):
-        current_state = 0  # S0
+        """ Expands the planning graph, writes the reports and returns the extracted plan """
+        current_state = self.expand_graph()
+        if self.reports:
+            self.write_reports(current_state)
+        return self.extract_plan()
+
+    def expand_graph(self):
+        """ Adds levels to the graph until it levels off and returns the last state level. With a checkpoint the
+        levels it holds are loaded first and every new level is appended to it """
+        checkpoint = None
+        if self.checkpoint_file:
+            checkpoint = GraphCheckpoint(self.checkpoint_file)
+            for record in checkpoint.resume(self.checkpoint_key, self.parser.symbols,
+                                            len(self.all_possible_actions)):
+                self.__restore_level(record)
+        current_state = len(self.states) - 1
+        precondition_index = self.build_precondition_index()
+        # per action (by id) the number of its preconditions missing from the current level
+        unmet_preconditions = [len(action.pre_set) for action in self.all_possible_actions]
+        possible_actions = set(self.action_state[current_state - 1]) if current_state else set()
+        # actions whose preconditions are all in the level but some pair of them is mutex
+        blocked_actions = [action for action in self.all_possible_actions
+                           if not action.pre_set and action not in possible_actions]
+        new_states = bitset_ids(self.states[current_state].facts)
         while True:
-            temp_state = self.states[current_state].copy()
-            possible_actions = set()
-            for action in self.all_possible_actions:
-                action_flag = True
-                pre_cond = action.positive_preconditions
-                for precondition in pre_cond:
-                    if not self.applicable(self.states[current_state], precondition):
-                        action_flag = False
-                        break
-                if action_flag:
-                    for effect in action.del_effects:
-                        temp_state.add(tuple(['not']) + effect)
-                    for effect in action.add_effects:
-                        temp_state.add(effect)
-                    possible_actions.add(action)
-
-            if temp_state == self.states[current_state] or len(possible_actions) == 0:
+            # only the actions needing a fact added at the previous level can become applicable
+            for state in new_states:
+                for action in precondition_index.get(state, ()):
+                    unmet_preconditions[action.id] -= 1
+                    if not unmet_preconditions[action.id] and action not in possible_actions:
+                        blocked_actions.append(action)
+            # fact mutexes only disappear, so the blocked actions are checked again at every level
+            fact_mutexes = self.inconsistent_support[current_state]
+            new_actions = []
+            still_blocked = []
+            for action in blocked_actions:
+                if self.mutex_free(action.positive_preconditions, fact_mutexes):
+                    new_actions.append(action)
+                else:
+                    still_blocked.append(action)
+            blocked_actions = still_blocked
+            possible_actions.update(new_actions)
+
+            # level off: with the same actions and fact mutexes as the previous level, the next levels repeat it
+            if len(possible_actions) == 0 or (
+                    not new_actions and fact_mutexes == self.inconsistent_support.get(current_state - 1)):
                 break
+
+            # the effects of the older actions are already in the current level
+            temp_state = self.states[current_state].expand(
+                [effect for action in new_actions for effect in action.add_effects],
+                [effect for action in new_actions for effect in action.del_effects])
+            new_states = temp_state.new_facts(self.states[current_state])
+            self.action_state[current_state] = set(possible_actions)
+            if self.record_mutexes:
+                self.update_mutexes(current_state, new_actions)
+            elif self.mutex_engine:
+                # the parallel engine checks the fact mutexes over the actions it was given
+                self.mutex_engine.activate(new_actions)
+            current_state += 1
+            self.states[current_state] = temp_state
+            self.update_fact_mutexes(current_state)
+            if checkpoint:
+                checkpoint.append(self.__level_record(current_state - 1, new_actions))
+        if checkpoint:
+            checkpoint.close()
+        if self.mutex_engine:
+            self.mutex_engine.close()
+        return current_state
+
+    def __level_record(self, action_level, new_actions):
+        """ The checkpoint record of an action level and the state level after it, with ids only """
+        next_layer = self.states[action_level + 1]
+        effect_pairs = []
+        effect_facts = []
+        for item_1, item_2 in self.inconsistent_effects[action_level]:
+            if isinstance(item_2, GroundAction):
+                effect_pairs.append((item_1.id, item_2.id))
+            else:
+                effect_facts.append((item_1.id, item_2))
+        return {'level': action_level, 'actions': [action.id for action in new_actions],
+                'effect_pairs': effect_pairs, 'effect_facts': effect_facts,
+                'interference': [(action_1.id, action_2.id) for action_1, action_2 in self.interference[action_level]],
+                'facts': bitset_ids(next_layer.facts), 'deleted': bitset_ids(next_layer.deleted),
+                'fact_mutexes': list(self.inconsistent_support[action_level + 1])}
+
+    def __restore_level(self, record):
+        actions = self.all_possible_actions
+        action_level = record['level']
+        new_actions = [actions[action_id] for action_id in record['actions']]
+        self.action_state[action_level] = self.action_state.get(action_level - 1, set()) | set(new_actions)
+        self.index_actions(new_actions)
+        inconsistent_effects = {(actions[id_1], actions[id_2]) for id_1, id_2 in record['effect_pairs']}
+        inconsistent_effects.update((actions[action_id], fact) for action_id, fact in record['effect_facts'])
+        self.inconsistent_effects[action_level] = inconsistent_effects
+        self.inconsistent_effects['all_mutexes'] |= inconsistent_effects
+        interference = {(actions[id_1], actions[id_2]) for id_1, id_2 in record['interference']}
+        self.interference[action_level] = interference
+        self.interference['all_mutexes'] |= interference
+        self.states[action_level + 1] = FactLayer(to_bitset(record['facts']), to_bitset(record['deleted']))
+        self.inconsistent_support[action_level + 1] = set(record['fact_mutexes'])
+
+    def extract_plan(self):
+        """ Searches the graph backward from the positive goal facts and returns the plan as a list of steps,
+        each the list of GroundActions that can run in parallel at that level, or None when there is none.
+
+        The search starts at the first level holding the goals without mutexes between them and moves one level
+        up after every failure; the levels past the level off repeat the last one. Goal sets that fail at a
+        level are kept as nogoods, and once the nogoods of the level off level stop changing between two tries
+        no plan exists.
+
+        Achievers are assigned with forward checking and conflict directed backjumping. Choosing an achiever drops
+        the achievers of the other goals mutex with it, and the goal with the fewest achievers left comes next. A
+        failure names the goals it comes from: the goal left without achiever and the goals whose achievers ruled
+        out its achievers, or the goals whose achievers need the goals failing one level down. The search goes back to the latest goal of the failure,
+        as other achievers for the goals in between fail the same way, and a goal set failing for a part of its
+        goals keeps that part as a conflict of the level: every goal set holding a conflict fails at once. The
+        level off test counts the conflicts along the nogoods.
+        """
+        start = time.perf_counter()
+        try:
+            return self.__extract_plan()
+        finally:
+            self.extraction_time = time.perf_counter() - start
+
+    def __extract_plan(self):
+        goals = frozenset(self.parser.positive_goal_facts)
+        last_level = len(self.states) - 1
+        self.nogoods = {}
+        self.nogood_lookups = {}
+        self.nogood_hits = {}
+        self.__extraction_achievers = {}
+        self.conflicts = {}
+        self.conflict_hits = 0
+        self.extraction_searches = 0
+        self.extraction_steps = 0
+        self.__budget_spent = False
+        level = next((level for level in range(last_level + 1) if self.__goals_possible(goals, level)), None)
+        if level is None:
+            return None
+        nogoods_at_level_off = None
+        while True:
+            plan, _ = self.__extract(goals, level)
+            if plan is not None or self.__budget_spent:
+                return plan
+            if level >= last_level:
+                failures = len(self.nogoods.get(last_level, ())) + sum(
+                    len(sets) for sets in self.conflicts.get(last_level, {}).values())
+                if failures == nogoods_at_level_off:
+                    return None
+                nogoods_at_level_off = failures
+            level += 1
+
+    def extraction_statistics(self):
+        """ The goal sets searched and achievers tried by the last extraction, its nogood and conflict hits, the
+        conflicts found, its time and whether it ran out of budget """
+        return {'searches': self.extraction_searches, 'steps': self.extraction_steps,
+                'nogood_hits': sum(self.nogood_hits.values()),
+                'conflict_hits': self.conflict_hits,
+                'conflicts': sum(len(sets) for index in self.conflicts.values() for sets in index.values()),
+                'extraction_time': self.extraction_time, 'budget_spent': self.__budget_spent}
+
+    def nogood_hit_rates(self):
+        """ level -> the share of the goal set lookups of the last extraction found in the nogood table """
+        return {level: self.nogood_hits.get(level, 0) / lookups for level, lookups in self.nogood_lookups.items()}
+
+    def __goals_possible(self, goals, level):
+        layer = self.states[level]
+        return all(goal in layer for goal in goals) and self.mutex_free(goals, self.inconsistent_support[level])
+
+    def __extract(self, goals, level):
+        """ The steps reaching goals (a frozenset of fact ids) at level and None, or None and the goals among them
+        that already fail together, None when the budget ran out """
+        if level == 0:
+            return [], None
+        self.nogood_lookups[level] = self.nogood_lookups.get(level, 0) + 1
+        nogoods = self.nogoods.setdefault(level, set())
+        conflicts = self.conflicts.setdefault(level, {})
+        nogood = goals
+        if self.symmetry:
+            # a renaming of a goal set inside the object orbits is reachable exactly when the set is
+            nogood = self.symmetry.canonical_set([self.parser.symbols.fact_keys[goal] for goal in goals])
+        if nogood in nogoods:
+            self.nogood_hits[level] = self.nogood_hits.get(level, 0) + 1
+            return None, self.__known_conflict(goals, conflicts) or goals
+        conflict = self.__known_conflict(goals, conflicts)
+        if conflict is not None:
+            self.conflict_hits += 1
+            nogoods.add(nogood)
+            return None, conflict
+        self.extraction_searches += 1
+        # the graph does not change past its last level
+        action_level = min(level, len(self.states) - 1) - 1
+        if action_level not in self.__extraction_achievers:
+            self.__extraction_achievers[action_level] = self.level_achievers(action_level)
+        achievers = self.__extraction_achievers[action_level]
+        candidates = {goal: achievers[goal] for goal in sorted(goals, key=lambda goal: len(achievers[goal]))}
+        plan, conflict = self.__assign(candidates, dict.fromkeys(goals, frozenset()), [], [], level)
+        if plan is not None or self.__budget_spent:
+            return plan, None
+        nogoods.add(nogood)
+        conflict = frozenset(conflict)
+        if conflict != goals:
+            conflicts.setdefault(min(conflict), []).append(conflict)
+        return None, conflict
+
+    @staticmethod
+    def __known_conflict(goals, conflicts):
+        """ A conflict of the level held in goals, or None """
+        return next((conflict for goal in goals for conflict in conflicts.get(goal, ()) if conflict <= goals), None)
+
+    def __assign(self, candidates, blockers, chosen, owners, level):
+        """ Picks pairwise non mutex achievers for the goals of candidates, which maps each goal not yet achieved to
+        its achievers not mutex with the chosen ones, then extracts their preconditions one level down. owners
+        holds the goal each chosen achiever is for, blockers maps each goal to the owners ruling out some of its
+        achievers.
+
+        Returns the plan and None, or None and the conflict: goals that fail together whatever achievers the ones
+        of candidates get, as long as the owners keep theirs. None when the budget ran out.
+        """
+        if not candidates:
+            plan, conflict = self.__extract(
+                frozenset().union(*(achiever.preconditions for achiever in chosen)), level - 1)
+            if plan is None:
+                # the goals whose achievers need the preconditions failing one level down
+                return None, conflict and {owner for owner, achiever in zip(owners, chosen)
+                                           if not conflict.isdisjoint(achiever.preconditions)}
+            return plan + [[achiever.action for achiever in chosen if achiever.action is not None]], None
+        # the goal with the fewest achievers left is assigned first
+        goal = min(candidates, key=lambda goal: len(candidates[goal]))
+        conflict = {goal} | blockers[goal]
+        for achiever in candidates[goal]:
+            if self.extraction_budget is not None and self.extraction_steps >= self.extraction_budget:
+                self.__budget_spent = True
+                return None, None
+            self.extraction_steps += 1
+            # the other goals the achiever does not add keep their achievers not mutex with it
+            remaining = {}
+            remaining_blockers = {}
+            for other_goal, others in candidates.items():
+                if other_goal == goal or other_goal in achiever.adds:
+                    continue
+                kept = [other for other in others if not achiever.mutex(other)]
+                remaining_blockers[other_goal] = blockers[other_goal]
+                if len(kept) < len(others):
+                    remaining_blockers[other_goal] = blockers[other_goal] | {goal}
+                if not kept:
+                    conflict.update(remaining_blockers[other_goal], (other_goal,))
+                    break
+                remaining[other_goal] = kept
             else:
-                self.action_state[current_state] = possible_actions
-                self.update_mutexes(current_state)
-                current_state += 1
-                self.states[current_state] = temp_state
+                chosen.append(achiever)
+                owners.append(goal)
+                plan, deeper_conflict = self.__assign(remaining, remaining_blockers, chosen, owners, level)
+                chosen.pop()
+                owners.pop()
+                if plan is not None or self.__budget_spent:
+                    return plan, None
+                if goal not in deeper_conflict:
+                    # the achiever chosen for this goal plays no part in the failure, the others fail the same way
+                    return None, deeper_conflict
+                conflict |= deeper_conflict
+        return None, conflict
+
+    @staticmethod
+    def mutex_free(facts, fact_mutexes):
+        """ True when no two of the fact ids are mutex """
+        return not any(pair in fact_mutexes for pair in itertools.combinations(sorted(facts), 2))
+
+    def update_mutexes(self, last_state_level, new_actions=None):
+        """ Records the inconsistent effects and interference mutexes that first appear at last_state_level.
+
+        Actions and facts only accumulate over the levels, so the only new pairs are the ones with an action
+        (or a fact) that is new at this level; the mutex engine finds their partners through the fact ->
+        deleting, adding and requiring actions indexes, here or in worker processes, or the sparse incidence
+        matrices. Action pairs are stored once, ordered by action id.
+        new_actions: the actions first applicable at this level, computed from action_state when not given
+        """
+        if new_actions is None:
+            new_actions = [action for action in self.action_state[last_state_level]
+                           if action.id not in self.mutex_indexed_actions]
+        self.index_actions(new_actions)
+        layer = self.states[last_state_level]
+        previous_layer = self.states[last_state_level - 1] if last_state_level else FactLayer()
+
+        if self.mutex_engine:
+            inconsistent_effects, interference = self.mutex_engine.level_mutexes(new_actions, layer, previous_layer)
+        else:
+            inconsistent_effects, interference = self.__index_mutexes(new_actions, layer, previous_layer)
+        self.inconsistent_effects[last_state_level] = inconsistent_effects
+        self.inconsistent_effects['all_mutexes'] |= inconsistent_effects
+        self.interference[last_state_level] = interference
+        self.interference['all_mutexes'] |= interference
+
+    def index_actions(self, new_actions):
+        """ Adds the actions entering the graph to the fact -> deleting, adding and requiring actions indexes and
+        to the mutex engine """
+        if self.mutex_engine is None and self.mutex_engine_name == 'matrix':
+            from matrix_mutexes import MatrixMutexes
+            self.mutex_engine = MatrixMutexes(self.all_possible_actions, len(self.parser.symbols))
+        for action in new_actions:
+            self.mutex_indexed_actions.add(action.id)
+            for fact in action.del_effects:
+                self.deleters_index.setdefault(fact, []).append(action)
+            for fact in action.add_effects:
+                self.adders_index.setdefault(fact, []).append(action)
+            for fact in action.positive_preconditions:
+                self.requirers_index.setdefault(fact, []).append(action)
+        if self.mutex_engine:
+            self.mutex_engine.activate(new_actions)
 
-        self.write_actions_states_occurred(current_state)
-        self.write_mutexes()
+    def competing_needs(self, action_level):
+        """ The action pairs of action_level with mutex preconditions, ordered by action id """
+        actions = self.action_state[action_level]
+        competing_needs = set()
+        for fact_1, fact_2 in self.inconsistent_support[action_level]:
+            for action_1 in self.requirers_index.get(fact_1, ()):
+                if action_1 in actions:
+                    for action_2 in self.requirers_index.get(fact_2, ()):
+                        if action_2 in actions:
+                            competing_needs.add(self.__action_pair(action_1, action_2))
+        return competing_needs
 
-    def update_mutexes(self, last_state_level):
-        concated_actions = set()
-        for level, actions in self.action_state.items():
-            for action in actions:
-                concated_actions.add(action)
+    def update_fact_mutexes(self, state_level):
+        """ Records the fact mutexes of state_level: the fact pairs whose achievers at the previous action
+        level, no-ops included, are all pairwise mutex.
 
+        A pair that was not mutex at the previous level stays so (its no-ops are not mutex), so only the previous
+        mutexes and the pairs with a fact new at this level are checked, in tiles by the 'parallel' mutex engine.
+        """
+        action_level = state_level - 1
+        layer = self.states[state_level]
+        previous_layer = self.states[action_level]
+        candidates = set(self.inconsistent_support[action_level])
+        facts = bitset_ids(layer.facts)
+        for fact_1 in layer.new_facts(previous_layer):
+            for fact_2 in facts:
+                if fact_1 != fact_2:
+                    candidates.add((fact_1, fact_2) if fact_1 < fact_2 else (fact_2, fact_1))
+        if not self.symmetry:
+            self.inconsistent_support[state_level] = self.__mutex_fact_pairs(action_level, candidates)
+            return
+        # the pairs a renaming inside the object orbits maps onto each other are all mutex or all not, so only the
+        # first pair of every orbit is checked
+        fact_keys = self.parser.symbols.fact_keys
+        orbits = {}
+        for fact_1, fact_2 in candidates:
+            orbits.setdefault(self.symmetry.canonical_pair(fact_keys[fact_1], fact_keys[fact_2]), []).append(
+                (fact_1, fact_2))
+        mutexes = self.__mutex_fact_pairs(action_level, [pairs[0] for pairs in orbits.values()])
+        self.inconsistent_support[state_level] = {
+            pair for pairs in orbits.values() if pairs[0] in mutexes for pair in pairs}
+
+    def __mutex_fact_pairs(self, action_level, candidates):
+        """ The candidate fact pairs whose achievers at action_level are all pairwise mutex """
+        if isinstance(self.mutex_engine, ParallelMutexes):
+            return self.mutex_engine.fact_mutexes(action_level, self.inconsistent_support[action_level],
+                                                  self.states[action_level].facts, candidates)
+        achievers = self.level_achievers(action_level)
+        return {pair for pair in candidates if self.__achievers_mutex(achievers[pair[0]], achievers[pair[1]])}
+
+    def level_achievers(self, action_level):
+        """ fact id -> the Achievers adding it at action_level, its no-op first """
+        mutex_with = {}  # fact id -> the facts mutex with it at the level
+        for fact_1, fact_2 in self.inconsistent_support[action_level]:
+            mutex_with.setdefault(fact_1, set()).add(fact_2)
+            mutex_with.setdefault(fact_2, set()).add(fact_1)
+        achievers = {}
+        for fact in bitset_ids(self.states[action_level].facts):
+            achievers[fact] = [Achiever.noop(fact, mutex_with.get(fact, frozenset()))]
+        for action in self.action_state[action_level]:
+            achiever = Achiever(action, action.pre_set, action.add_set, action.del_set,
+                                set().union(*(mutex_with.get(fact, ()) for fact in action.pre_set)))
+            for fact in action.add_effects:
+                achievers.setdefault(fact, []).append(achiever)
+        return achievers
+
+    @staticmethod
+    def __achievers_mutex(achievers_1, achievers_2):
+        """ True when every achiever of the first list is mutex with every achiever of the second """
+        return all(achiever_1.mutex(achiever_2) for achiever_1 in achievers_1 for achiever_2 in achievers_2)
+
+    def __index_mutexes(self, new_actions, layer, previous_layer):
+        """ The inconsistent effects and interference pairs that first appear with new_actions """
         # inconsistent effects
-        self.inconsistent_effects[last_state_level] = set()
-        for action_1 in concated_actions:
-            for action_2 in concated_actions:
-                if action_1 != action_2 and len(set(action_1.del_effects).intersection(action_2.add_effects)):
-                    if (action_1, action_2,) not in self.inconsistent_effects['all_mutexes'] and \
-                            (action_2, action_1) not in self.inconsistent_effects['all_mutexes']:
-                        self.inconsistent_effects['all_mutexes'].add((action_1, action_2))
-                        self.inconsistent_effects[last_state_level].add((action_1, action_2))
-
-            for state in self.states[last_state_level]:
-                if state in action_1.del_effects and (action_1, state,) not in self.inconsistent_effects['all_mutexes']:
-                    self.inconsistent_effects['all_mutexes'].add((action_1, state))
-                    self.inconsistent_effects[last_state_level].add((action_1, state))
+        inconsistent_effects = set()
+        for action in new_actions:
+            for fact in action.del_effects:
+                for other in self.adders_index.get(fact, ()):
+                    if other is not action:
+                        inconsistent_effects.add(self.__action_pair(action, other))
+                if fact in layer:
+                    inconsistent_effects.add((action, fact))
+            for fact in action.add_effects:
+                for other in self.deleters_index.get(fact, ()):
+                    if other is not action:
+                        inconsistent_effects.add(self.__action_pair(action, other))
+        # older actions deleting a fact that is new in this level
+        for fact in layer.new_facts(previous_layer):
+            for action in self.deleters_index.get(fact, ()):
+                inconsistent_effects.add((action, fact))
 
         # interference
-        self.interference[last_state_level] = set()
-        for action_1 in concated_actions:
-            for action_2 in concated_actions:
-                if action_1 != action_2 and len(
-                        set(action_1.del_effects).intersection(action_2.positive_preconditions)):
-                    if (action_1, action_2,) not in self.interference['all_mutexes'] and \
-                            (action_2, action_1) not in self.interference['all_mutexes']:
-                        self.interference['all_mutexes'].add((action_1, action_2))
-                        self.interference[last_state_level].add((action_1, action_2))
-
-        # inconsistent support
-        self.inconsistent_support[last_state_level] = set()
-        for state_1 in self.states[last_state_level]:
-            for state_2 in self.states[last_state_level]:
-                if (('not',) + state_1 == state_2 or state_1 == state_2 + ('not',)) and \
-                        ((state_1, state_2) not in self.inconsistent_support['all_mutexes'] and
-                         (state_2, state_1) not in self.inconsistent_support['all_mutexes']):
-                    self.inconsistent_support['all_mutexes'].add((state_1, state_2))
-                    self.inconsistent_support[last_state_level].add((state_1, state_2))
-
-    def write_actions_states_occurred(self, current_state):
-        data = 'Actions and States occurred per level \n' + '-'*50 + '\n'
+        interference = set()
+        for action in new_actions:
+            for fact in action.del_effects:
+                for other in self.requirers_index.get(fact, ()):
+                    if other is not action:
+                        interference.add(self.__action_pair(action, other))
+            for fact in action.positive_preconditions:
+                for other in self.deleters_index.get(fact, ()):
+                    if other is not action:
+                        interference.add(self.__action_pair(action, other))
+        return inconsistent_effects, interference
+
+    @staticmethod
+    def __action_pair(action_1, action_2):
+        """ The canonical (lower id, higher id) order of an action pair """
+        if action_1.id < action_2.id:
+            return action_1, action_2
+        return action_2, action_1
+
+    def write_actions_states_occurred(self, f, current_state):
+        symbols = self.parser.symbols
+        f.write('Actions and States occurred per level \n' + '-'*50 + '\n')
         for level in range(current_state):
-            data += 'At level {} we had {} states and we found {} new actions\n'.format(
-                level, len(self.states[level]), len(self.action_state[level]))
-            data += '\nStates: \n'
+            f.write('At level {} we had {} states and we found {} new actions\n'.format(
+                level, len(self.states[level]), len(self.action_state[level])))
+            f.write('\nStates: \n')
             for state in self.states[level]:
-                data += "%s \n" % ', '.join(state)
-            data += '\nActions: \n'
+                f.write("%s \n" % ', '.join(symbols.literal_name(state)))
+            f.write('\nActions: \n')
             for action in self.action_state[level]:
-                data += action.__str__()
-            data += '-'*100 + '\n'
+                f.write(action.describe(symbols))
+            f.write('-'*100 + '\n')
 
         # write last level's states
-        data += 'At level {} we had {} states\n'.format(current_state, len(self.states[current_state]))
-        data += '\nStates: \n'
+        f.write('At level {} we had {} states\n'.format(current_state, len(self.states[current_state])))
+        f.write('\nStates: \n')
         for state in self.states[current_state]:
-            data += "%s \n" % ', '.join(state)
+            f.write("%s \n" % ', '.join(symbols.literal_name(state)))
 
-        with open('graphPlan_states_actions.txt', 'w') as f:
-            f.write(data)
+    def write_actions_states_occurred_jsonl(self, f, current_state):
+        """ One line per level with its fact ids, deleted fact ids and action ids """
+        for level in range(current_state + 1):
+            record = {'level': level, 'facts': bitset_ids(self.states[level].facts),
+                      'deleted': bitset_ids(self.states[level].deleted)}
+            if level in self.action_state:
+                record['actions'] = sorted(action.id for action in self.action_state[level])
+            self.__write_json(f, record)
 
-    def write_mutexes(self):
-        data = 'Mutexes found: \n'
-        data += 'Inconsistent effects:\n'
-        for level, mutexes in self.inconsistent_effects.items():
-            if level == 'all_mutexes':
-                continue
-            data += 'At level {}:\n'.format(level)
-            if not len(mutexes):
-                data += 'No mutexes\n' + '-' * 100 + '\n'
-            else:
-                for mutex_pair in mutexes:
-                    data += mutex_pair[0].__str__()
-                    data += mutex_pair[1].__str__()
-                    data += '\n' + '-' * 100 + '\n'
+    @staticmethod
+    def __write_json(f, record):
+        f.write(json.dumps(record, separators=(',', ':')))
+        f.write('\n')
 
-        data += '\n{}\nInterference:\n'.format('-'*100)
-        for level, mutexes in self.interference.items():
-            if level == 'all_mutexes':
-                continue
-            data += 'At level {}:\n'.format(level)
-            if not len(mutexes):
-                data += 'No mutexes\n' + '-' * 100 + '\n'
-            else:
-                for mutex_pair in mutexes:
-                    data += mutex_pair[0].__str__()
-                    data += mutex_pair[1].__str__()
-                    data += '\n' + '-' * 100 + '\n'
+    def __describe(self, item):
+        """ Readable text of a ground action or of a fact literal """
+        if isinstance(item, GroundAction):
+            return item.describe(self.parser.symbols)
+        return str(self.parser.symbols.literal_name(item))
+
+    def __action_label(self, action):
+        """ name(parameters) #id of a ground action """
+        return '{}({}) #{}'.format(action.name, ', '.join(self.parser.symbols.object_name(obj)
+                                                           for obj in action.parameters), action.id)
+
+    def write_mutexes(self, f):
+        f.write('Mutexes found: \n')
+        f.write('Inconsistent effects:\n')
+        self.__write_mutex_levels(f, self.inconsistent_effects.items())
+        f.write('\n{}\nInterference:\n'.format('-'*100))
+        self.__write_mutex_levels(f, self.interference.items())
+        f.write('\n{}\nInconsistent support:\n'.format('-' * 100))
+        self.__write_mutex_levels(f, self.inconsistent_support.items(), '\t\t')
+        # the pairs of every level described in full would dwarf the other sections, their actions are only named
+        f.write('\n{}\nCompeting needs:\n'.format('-' * 100))
+        for level in self.action_state:
+            f.write('At level {}:\n'.format(level))
+            competing_needs = sorted(self.competing_needs(level), key=lambda pair: (pair[0].id, pair[1].id))
+            if not competing_needs:
+                f.write('No mutexes\n' + '-' * 100 + '\n')
+            for action_1, action_2 in competing_needs:
+                f.write(self.__action_label(action_1) + '\t\t' + self.__action_label(action_2) + '\n')
 
-        data += '\n{}\nInconsistent support:\n'.format('-' * 100)
-        for level, mutexes in self.inconsistent_support.items():
+    def __write_mutex_levels(self, f, levels, separator=''):
+        for level, mutexes in levels:
             if level == 'all_mutexes':
                 continue
-            data += 'At level {}:\n'.format(level)
+            f.write('At level {}:\n'.format(level))
             if not len(mutexes):
-                data += 'No mutexes\n' + '-' * 100 + '\n'
+                f.write('No mutexes\n' + '-' * 100 + '\n')
             else:
                 for mutex_pair in mutexes:
-                    data += mutex_pair[0].__str__() + '\t\t'
-                    data += mutex_pair[1].__str__()
-                    data += '\n' + '-' * 100 + '\n'
+                    f.write(self.__describe(mutex_pair[0]) + separator)
+                    f.write(self.__describe(mutex_pair[1]))
+                    f.write('\n' + '-' * 100 + '\n')
 
-        with open('graphPlan_mutexes.txt', 'w') as f:
-            f.write(data)
+    def write_mutexes_jsonl(self, f):
+        """ One line per mutex: its kind, level and the action ids, action and fact ids or fact ids it pairs """
+        for kind, mutexes in (('inconsistent_effects', self.inconsistent_effects),
+                              ('interference', self.interference)):
+            for level, pairs in mutexes.items():
+                if level == 'all_mutexes':
+                    continue
+                for item_1, item_2 in pairs:
+                    if isinstance(item_2, GroundAction):
+                        self.__write_json(f, {'mutex': kind, 'level': level, 'actions': [item_1.id, item_2.id]})
+                    else:
+                        self.__write_json(f, {'mutex': kind, 'level': level, 'action': item_1.id, 'fact': item_2})
+        for level, pairs in self.inconsistent_support.items():
+            for fact_1, fact_2 in pairs:
+                self.__write_json(f, {'mutex': 'inconsistent_support', 'level': level, 'facts': [fact_1, fact_2]})
+        for level in self.action_state:
+            for action_1, action_2 in self.competing_needs(level):
+                self.__write_json(f, {'mutex': 'competing_needs', 'level': level,
+                                      'actions': [action_1.id, action_2.id]})
 
 
 if __name__ == '__main__':
     domain = "Depots.pddl"
     problem = "pfile1.pddl"
-    planner = Planner(domain, problem)
-    planner.graph_plan()
+    planner = Planner(domain, problem, reports='text')
+    plan = planner.graph_plan()
+    if plan is None:
+        print('No plan found')
+    else:
+        for step, actions in enumerate(plan):
+            print('Step {}: {}'.format(step, ', '.join(
+                '{}({})'.format(action.name, ', '.join(planner.parser.symbols.object_name(obj)
+                                                       for obj in action.parameters)) for action in actions)))
+    for level, hit_rate in sorted(planner.nogood_hit_rates().items()):
+        print('Nogood hits at level {}: {:.1%} of {} lookups'.format(level, hit_rate, planner.nogood_lookups[level]))
@@ -0,0 +1,56 @@
+class SymbolTable:
+    """ Interns predicate and object names into dense integer ids and every ground atom into one fact id.
+
+    A fact is keyed by (predicate id, object id, ...). Negated literals are written as ~fact_id (always < 0),
+    the readable names are only rebuilt through fact_name/literal_name when reports are written.
+    """
+
+    def __init__(self):
+        self.predicate_names = []
+        self.predicate_ids = {}
+        self.object_names = []
+        self.object_ids = {}
+        self.fact_keys = []  # fact id -> (predicate id, object id, ...)
+        self.fact_ids = {}
+
+    def predicate(self, name):
+        predicate_id = self.predicate_ids.get(name)
+        if predicate_id is None:
+            predicate_id = self.predicate_ids[name] = len(self.predicate_names)
+            self.predicate_names.append(name)
+        return predicate_id
+
+    def object(self, name):
+        object_id = self.object_ids.get(name)
+        if object_id is None:
+            object_id = self.object_ids[name] = len(self.object_names)
+            self.object_names.append(name)
+        return object_id
+
+    def intern_fact(self, key):
+        """ key: (predicate id, object id, ...) """
+        fact_id = self.fact_ids.get(key)
+        if fact_id is None:
+            fact_id = self.fact_ids[key] = len(self.fact_keys)
+            self.fact_keys.append(key)
+        return fact_id
+
+    def fact(self, atom):
+        """ atom: a sequence of names such as ('at', 'truck1', 'depot0') """
+        return self.intern_fact((self.predicate(atom[0]),) + tuple(self.object(name) for name in atom[1:]))
+
+    def fact_name(self, fact_id):
+        key = self.fact_keys[fact_id]
+        return (self.predicate_names[key[0]],) + tuple(self.object_names[object_id] for object_id in key[1:])
+
+    def literal_name(self, literal):
+        if literal < 0:
+            return ('not',) + self.fact_name(~literal)
+        return self.fact_name(literal)
+
+    def object_name(self, object_id):
+        return self.object_names[object_id]
+
+    def __len__(self):
+        """ Number of interned facts """
+        return len(self.fact_keys)
@@ -0,0 +1,88 @@
+class ObjectSymmetry:
+    """ Orbits of interchangeable objects: objects of the same types that a renaming swaps while leaving the
+    init facts unchanged. Objects named in the domain's actions are never renamed.
+
+    Only swaps of two objects are tried, so the orbits may be finer than the real ones, but any renaming inside
+    the orbits maps the init facts onto themselves. The planning graph is built from the init facts alone, so
+    such a renaming of a fact pair keeps it mutex or not mutex, and of a goal set keeps it reachable or not.
+    """
+
+    def __init__(self, parser):
+        symbols = parser.symbols
+        self.init_keys = {symbols.fact_keys[fact] for fact in parser.init_facts}
+        constants = set()
+        for action in parser.actions:
+            variables = {var for var, _ in action.parameters}
+            for atom in (action.positive_preconditions + action.negative_preconditions + action.add_effects +
+                         action.del_effects):
+                constants.update(symbols.object(arg) for arg in atom[1:] if arg not in variables)
+            constants.update(symbols.object(constant) for _, constant, _ in action.parameter_constants)
+        # object id -> the init fact keys it appears in
+        self.init_index = {}
+        for key in self.init_keys:
+            for obj in set(key[1:]):
+                self.init_index.setdefault(obj, []).append(key)
+        # objects can only swap with objects of the same types and the same (predicate, position) occurrences
+        types = {}
+        for type_name, objects in parser.objects.items():
+            for obj in objects:
+                types.setdefault(symbols.object(obj), set()).add(type_name)
+        classes = {}
+        for obj, object_types in types.items():
+            if obj in constants:
+                continue
+            occurrences = sorted((key[0], position) for key in self.init_index.get(obj, ())
+                                 for position, arg in enumerate(key[1:]) if arg == obj)
+            classes.setdefault((tuple(sorted(object_types)), tuple(occurrences)), []).append(obj)
+
+        self.orbits = {}  # object id -> its orbit, a sorted tuple of object ids, for the objects not alone in one
+        for objects in classes.values():
+            orbits = []
+            for obj in sorted(objects):
+                for orbit in orbits:
+                    if self.__swappable(orbit[0], obj):
+                        orbit.append(obj)
+                        break
+                else:
+                    orbits.append([obj])
+            for orbit in orbits:
+                if len(orbit) > 1:
+                    for obj in orbit:
+                        self.orbits[obj] = tuple(orbit)
+
+    def __swappable(self, object_1, object_2):
+        swap = {object_1: object_2, object_2: object_1}
+        return all((key[0],) + tuple(swap.get(arg, arg) for arg in key[1:]) in self.init_keys
+                   for obj in (object_1, object_2) for key in self.init_index.get(obj, ()))
+
+    def canonical_pair(self, key_1, key_2):
+        """ The same value for every two fact key pairs that a renaming inside the orbits maps onto each other """
+        return min(self.__relabel((key_1, key_2)), self.__relabel((key_2, key_1)))
+
+    def canonical_set(self, keys):
+        """ A renaming of the fact keys inside the orbits, shared by many of the sets it maps onto each other """
+        # order the facts by what any renaming keeps: the predicate and the orbits or fixed objects
+        ordered = sorted(keys, key=lambda key: (key[0],) + tuple(self.orbits.get(arg, (arg,))[0] for arg in key[1:]))
+        return frozenset(self.__relabel(ordered))
+
+    def __relabel(self, keys):
+        """ The keys with the objects of every orbit renamed to its members in order of first appearance """
+        renamed = {}
+        used = {}
+        relabeled = []
+        for key in keys:
+            args = []
+            for arg in key[1:]:
+                orbit = self.orbits.get(arg)
+                if orbit is not None:
+                    if arg not in renamed:
+                        renamed[arg] = orbit[used.get(orbit, 0)]
+                        used[orbit] = used.get(orbit, 0) + 1
+                    arg = renamed[arg]
+                args.append(arg)
+            relabeled.append((key[0],) + tuple(args))
+        return tuple(relabeled)
+
+    def __len__(self):
+        """ Number of orbits with more than one object """
+        return len(set(self.orbits.values()))
@@ -1,9 +1,15 @@
 import itertools
+import operator
 
 
 class Action:
 
-    def __init__(self, name, parameters, positive_preconditions, negative_preconditions, add_effects, del_effects):
+    def __init__(self, name, parameters, positive_preconditions, negative_preconditions, add_effects, del_effects,
+                 distinct_parameters=(), equal_parameters=()):
+        """ distinct_parameters: explicit (term, term) pairs that must be assigned different objects, from
+        (not (= ...)) preconditions; equal_parameters: pairs that must be assigned the same object, from (= ...)
+        preconditions. A term is a parameter or a constant object name
+        """
         self.name = name
         self.parameters = parameters
         self.positive_preconditions = [tuple(precondition) for precondition in positive_preconditions]
@@ -11,6 +17,15 @@ class Action:
         self.add_effects = [tuple(effect) for effect in add_effects]
         self.del_effects = [tuple(effect) for effect in del_effects]
         self.weight = 0
+        self.equal_parameters = []  # sorted (i, j) parameter index pairs that must get the same object
+        self.parameter_constants = []  # (parameter index, constant name, True when they must be equal)
+        self.unsatisfiable = False  # an equality between two constants fails
+        self.distinct_parameters = self.__distinct_parameters(
+            self.__equality_constraints(distinct_parameters, equal_parameters))
+        # substitution templates, compiled on the first ground() call
+        self.__templates = None
+        self.__template_constants = ()
+        self.__templates_symbols = None
 
     def __str__(self):
         return 'action: ' + self.name + \
@@ -25,43 +40,254 @@ class Action:
     def __eq__(self, other):
         return self.__dict__ == other.__dict__
 
-    def groundify(self, objects):
-        """ Generates all action's possible call combinations """
-        if not self.parameters:
-            yield self
+    def groundify(self, objects, symbols, first_id=0):
+        """ Generates all action's possible call combinations as GroundActions over the symbols' fact ids,
+        numbered from first_id """
+        typed_objects = {var_type: [symbols.object(obj) for obj in objects[var_type]]
+                         for _, var_type in self.parameters}
+        for action_id, assignment in enumerate(self.assignments(typed_objects, symbols), first_id):
+            yield self.ground(assignment, symbols, action_id)
+
+    def ground(self, assignment, symbols, action_id):
+        """ The GroundAction with the given id for one assignment (object ids, in parameter order) """
+        if self.__templates_symbols is not symbols:
+            self.__compile_templates(symbols)
+        values = assignment + self.__template_constants
+        intern = symbols.intern_fact
+        positive_preconditions, negative_preconditions, add_effects, del_effects = [
+            [intern(template(values)) for template in templates] for templates in self.__templates]
+        return GroundAction(action_id, self.name, assignment, positive_preconditions, negative_preconditions,
+                            add_effects, del_effects)
+
+    def __compile_templates(self, symbols):
+        """ Compiles every precondition and effect once into a getter that fills its fact key from
+        assignment + constants: each slot is either a parameter index or the position of a constant (the
+        predicate id or a constant object id) placed after the assignment """
+        variables = {var: index for index, (var, _) in enumerate(self.parameters)}
+        constants = []
+        constant_positions = {}
+
+        def constant(value):
+            if value not in constant_positions:
+                constant_positions[value] = len(self.parameters) + len(constants)
+                constants.append(value)
+            return constant_positions[value]
+
+        self.__templates = []
+        for group in (self.positive_preconditions, self.negative_preconditions, self.add_effects,
+                      self.del_effects):
+            templates = []
+            for pred in group:
+                slots = [constant(symbols.predicate(pred[0]))] + [
+                    variables[arg] if arg in variables else constant(symbols.object(arg)) for arg in pred[1:]]
+                if len(slots) == 1:
+                    # itemgetter of a single index would not return a tuple, a one item slice does
+                    templates.append(operator.itemgetter(slice(slots[0], slots[0] + 1)))
+                else:
+                    templates.append(operator.itemgetter(*slots))
+            self.__templates.append(templates)
+        self.__template_constants = tuple(constants)
+        self.__templates_symbols = symbols
+
+    def assignments(self, typed_objects, symbols, fact_index=None, joined_predicates=(), excluded_predicates=(),
+                    new_facts=None):
+        """ Generates the assignments (object ids, in parameter order) of the action.
+
+        The positive preconditions over joined_predicates (predicate ids) bind their parameters by a join against
+        the facts of fact_index, one precondition after the other; the parameters none of them mentions are then
+        enumerated over their type. A negative precondition over excluded_predicates must not be in fact_index.
+        new_facts: optional FactIndex of the facts of fact_index added since the last call, then only the
+        assignments joining at least one of them are generated, each once.
+        """
+        if self.unsatisfiable:
             return
-        type_map = []
-        variables = []
-        for var, var_type in self.parameters:
-            type_map.append(objects[var_type])
-            variables.append(var)
-        for assignment in itertools.product(*type_map):
-            if self.__skip_iteration(assignment):
-                continue
-            positive_preconditions = self.__replace(self.positive_preconditions, variables, assignment)
-            negative_preconditions = self.__replace(self.negative_preconditions, variables, assignment)
-            add_effects = self.__replace(self.add_effects, variables, assignment)
-            del_effects = self.__replace(self.del_effects, variables, assignment)
-            yield Action(self.name, assignment, positive_preconditions, negative_preconditions, add_effects,
-                         del_effects)
+        variables = {var: index for index, (var, _) in enumerate(self.parameters)}
+        # the objects each parameter may get, in type order, once the (not) equal to a constant ones are applied
+        candidates = [typed_objects[var_type] for _, var_type in self.parameters]
+        for i, constant, equal in self.parameter_constants:
+            obj = symbols.object(constant)
+            candidates[i] = [candidate for candidate in candidates[i] if (candidate == obj) == equal]
+        allowed = [set(objects) for objects in candidates]
+        joined = [atom for atom in self.__compile(self.positive_preconditions, variables, symbols)
+                  if atom[0] in joined_predicates]
+        excluded = [atom for atom in self.__compile(self.negative_preconditions, variables, symbols)
+                    if atom[0] in excluded_predicates]
+        # distinct[i]: the parameters that must not get the same object as parameter i
+        distinct = [[] for _ in self.parameters]
+        for i, j in self.distinct_parameters:
+            distinct[i].append(j)
+            distinct[j].append(i)
+        # equal[i]: the parameters that must get the same object as parameter i
+        equal = [[] for _ in self.parameters]
+        for i, j in self.equal_parameters:
+            equal[i].append(j)
+            equal[j].append(i)
+        # per join the preconditions in join order, each with the index it matches and the index of the facts it
+        # must not match
+        if new_facts is None:
+            joins = [(joined, [(fact_index, None)] * len(joined))]
+        else:
+            # the k-th precondition joins the new facts and the ones before it only the old ones, so an assignment
+            # comes from the join of its first precondition on a new fact
+            joins = []
+            for k, atom in enumerate(joined):
+                if atom[0] in new_facts.by_predicate:
+                    sources = [(fact_index, new_facts)] * k + [(fact_index, None)] * (len(joined) - 1 - k)
+                    joins.append(([atom] + joined[:k] + joined[k + 1:], [(new_facts, None)] + sources))
+        binding = [None] * len(self.parameters)
+        for preconditions, sources in joins:
+            for assignment in self.__join(preconditions, sources, 0, binding, allowed, distinct, equal, candidates):
+                if any((predicate,) + tuple(~arg if arg < 0 else assignment[arg] for arg in args) in fact_index
+                       for predicate, args in excluded):
+                    continue
+                yield assignment
 
     @staticmethod
-    def __replace(group, variables, assignment):
-        g = []
-        for pred in group:
-            pred = list(pred)
-            iv = 0
-            for v in variables:
-                while v in pred:
-                    pred[pred.index(v)] = assignment[iv]
-                iv += 1
-            g.append(pred)
-        return g
-
-    def __skip_iteration(self, assignment):
-        if self.name == 'drive' or self.name == 'lift' or self.name == 'drop':
-            if assignment[1] == assignment[2]:
-                return True
+    def __compile(group, variables, symbols):
+        """ (predicate id, arguments) per atom, where a parameter is referenced by its index and a constant
+        object by ~object_id """
+        return [(symbols.predicate(pred[0]),
+                 tuple(variables[arg] if arg in variables else ~symbols.object(arg) for arg in pred[1:]))
+                for pred in group]
+
+    def __join(self, preconditions, sources, index, binding, allowed, distinct, equal, candidates):
+        if index == len(preconditions):
+            free = [i for i, obj in enumerate(binding) if obj is None]
+            if not free:
+                yield tuple(binding)
             else:
-                return False
-        return False
+                yield from self.__enumerate(free, 0, binding, distinct, equal, candidates)
+            return
+        predicate, args = preconditions[index]
+        fact_index, skipped = sources[index]
+        for key in fact_index.candidates(predicate, args, binding):
+            if len(key) != len(args) + 1 or skipped is not None and key in skipped:
+                continue
+            newly_bound = []
+            matches = True
+            for arg, obj in zip(args, key[1:]):
+                if arg < 0:
+                    matches = ~arg == obj
+                elif binding[arg] is None:
+                    matches = (obj in allowed[arg] and all(binding[j] != obj for j in distinct[arg]) and
+                               all(binding[j] is None or binding[j] == obj for j in equal[arg]))
+                    if matches:
+                        binding[arg] = obj
+                        newly_bound.append(arg)
+                else:
+                    matches = binding[arg] == obj
+                if not matches:
+                    break
+            if matches:
+                yield from self.__join(preconditions, sources, index + 1, binding, allowed, distinct, equal,
+                                       candidates)
+            for arg in newly_bound:
+                binding[arg] = None
+
+    def __enumerate(self, free, k, binding, distinct, equal, candidates):
+        """ Product over the candidates of the free parameters, pruned as soon as a distinct pair gets equal
+        objects or an equal pair different ones """
+        i = free[k]
+        last = k == len(free) - 1
+        for obj in candidates[i]:
+            if distinct[i] and any(binding[j] == obj for j in distinct[i]):
+                continue
+            if equal[i] and any(binding[j] is not None and binding[j] != obj for j in equal[i]):
+                continue
+            binding[i] = obj
+            if last:
+                yield tuple(binding)
+            else:
+                yield from self.__enumerate(free, k + 1, binding, distinct, equal, candidates)
+        binding[i] = None
+
+    def __equality_constraints(self, distinct_parameters, equal_parameters):
+        """ Sorts the explicit equality constraints into equal_parameters, parameter_constants and unsatisfiable
+        and returns the (variable, variable) pairs that must differ """
+        variables = {var for var, _ in self.parameters}
+        distinct = []
+        for pairs, equal in ((distinct_parameters, False), (equal_parameters, True)):
+            for term_1, term_2 in pairs:
+                if term_1 not in variables:
+                    term_1, term_2 = term_2, term_1
+                if term_1 not in variables:
+                    if (term_1 == term_2) != equal:
+                        self.unsatisfiable = True
+                elif term_2 not in variables:
+                    self.parameter_constants.append((self.__parameter_index(term_1), term_2, equal))
+                elif not equal:
+                    distinct.append((term_1, term_2))
+                elif term_1 != term_2:
+                    self.equal_parameters.append(tuple(sorted((self.__parameter_index(term_1),
+                                                               self.__parameter_index(term_2)))))
+        self.equal_parameters.sort()
+        return distinct
+
+    def __parameter_index(self, variable):
+        return [var for var, _ in self.parameters].index(variable)
+
+    def __distinct_parameters(self, explicit):
+        """ Sorted (i, j) parameter index pairs that must differ: the explicit ones, plus every pair whose equal
+        groundings are degenerate no-ops, an add effect meeting a different delete effect and the action leaving
+        every state it applies to unchanged (its adds are preconditions, its deletes are added back) """
+        variables = [var for var, _ in self.parameters]
+        index = {var: i for i, var in enumerate(variables)}
+        pairs = set()
+        for var_1, var_2 in explicit:
+            if var_1 == var_2:
+                raise Exception('Parameter ' + var_1 + ' of ' + self.name + ' cannot differ from itself')
+            pairs.add(tuple(sorted((index[var_1], index[var_2]))))
+        for i, j in itertools.combinations(range(len(variables)), 2):
+            rename = {variables[j]: variables[i]}
+            deleted = {}
+            for effect in self.del_effects:
+                deleted.setdefault(tuple(rename.get(arg, arg) for arg in effect), []).append(effect)
+            added = [(tuple(rename.get(arg, arg) for arg in effect), effect) for effect in self.add_effects]
+            if not any(deleted_effect != effect for renamed, effect in added
+                       for deleted_effect in deleted.get(renamed, ())):
+                continue
+            adds = {renamed for renamed, _ in added}
+            preconditions = {tuple(rename.get(arg, arg) for arg in precondition)
+                             for precondition in self.positive_preconditions}
+            if preconditions.issuperset(adds) and adds.issuperset(deleted):
+                pairs.add((i, j))
+        return sorted(pairs)
+
+
+class GroundAction:
+    """ An action with all its parameters assigned to object ids; preconditions and effects are fact ids.
+
+    Ground actions are compared and hashed by their id, which the grounder makes unique inside one task.
+    pre_set, add_set and del_set are frozenset views of the positive preconditions and of the effects.
+    """
+    __slots__ = ('id', 'name', 'parameters', 'positive_preconditions', 'negative_preconditions', 'add_effects',
+                 'del_effects', 'pre_set', 'add_set', 'del_set')
+
+    def __init__(self, action_id, name, parameters, positive_preconditions, negative_preconditions, add_effects,
+                 del_effects):
+        self.id = action_id
+        self.name = name
+        self.parameters = tuple(parameters)
+        self.positive_preconditions = tuple(positive_preconditions)
+        self.negative_preconditions = tuple(negative_preconditions)
+        self.add_effects = tuple(add_effects)
+        self.del_effects = tuple(del_effects)
+        self.pre_set = frozenset(self.positive_preconditions)
+        self.add_set = frozenset(self.add_effects)
+        self.del_set = frozenset(self.del_effects)
+
+    def describe(self, symbols, hadd):
+        """ Same text as Action.__str__, with the ids translated back to names and hadd as the Hadd value """
+        return 'action: ' + self.name + \
+               '\n  parameters: ' + str(tuple(symbols.object_name(obj) for obj in self.parameters)) + \
+               '\n  positive_preconditions: ' + str([symbols.fact_name(f) for f in self.positive_preconditions]) + \
+               '\n  add_effects: ' + str([symbols.fact_name(f) for f in self.add_effects]) + \
+               '\n  Hadd value: ' + str(hadd) + '\n'
+
+    def __hash__(self):
+        return self.id
+
+    def __eq__(self, other):
+        if not isinstance(other, GroundAction):
+            return NotImplemented
+        return self.id == other.id
@@ -0,0 +1,168 @@
+import os
+import random
+import sys
+import tempfile
+import time
+
+from bitset import bitset_ids, to_bitset
+from forward_search import ForwardSearch
+from grounder import Grounder
+from relaxation import Planner
+
+
+# a task whose one action must be grounded with both parameters equal: going from l1 to l1 visits it
+VISIT_DOMAIN = """(define (domain visit)
+  (:requirements :strips :typing)
+  (:types place)
+  (:predicates (at ?p - place) (visited ?p - place))
+  (:action go
+    :parameters (?f - place ?t - place)
+    :precondition (and (at ?f))
+    :effect (and (at ?t) (visited ?t) (not (at ?f)))))
+"""
+VISIT_PROBLEM = """(define (problem visit1) (:domain visit)
+  (:objects l1 - place)
+  (:init (at l1))
+  (:goal (and (visited l1))))
+"""
+
+
+def generate_depots_problem(filename, depots, distributors, trucks, pallets, hoists, crates, seed=0):
+    """ Writes a random solvable Depots problem (same domain as Depots.pddl) and returns its number of init
+    facts """
+    rnd = random.Random(seed)
+    places = ['depot%d' % i for i in range(depots)] + ['distributor%d' % i for i in range(distributors)]
+    init = []
+    # every pallet is a stack; crates are piled on random stacks
+    stack_top = {}
+    stack_place = {}
+    for i in range(pallets):
+        pallet = 'pallet%d' % i
+        place = places[i % len(places)]
+        init.append('(at %s %s)' % (pallet, place))
+        stack_top[pallet] = pallet
+        stack_place[pallet] = place
+    pallet_names = list(stack_top)
+    for i in range(crates):
+        crate = 'crate%d' % i
+        pallet = rnd.choice(pallet_names)
+        init.append('(at %s %s)' % (crate, stack_place[pallet]))
+        init.append('(on %s %s)' % (crate, stack_top[pallet]))
+        stack_top[pallet] = crate
+    for top in stack_top.values():
+        init.append('(clear %s)' % top)
+    for i in range(trucks):
+        init.append('(at truck%d %s)' % (i, rnd.choice(places)))
+    for i in range(hoists):
+        init.append('(at hoist%d %s)' % (i, places[i % len(places)]))
+        init.append('(available hoist%d)' % i)
+    # one goal crate per pallet, so the problem stays solvable
+    goals = ['(on crate%d pallet%d)' % (i, pallet) for i, pallet in enumerate(rnd.sample(range(pallets),
+                                                                                          min(crates, pallets)))]
+
+    with open(filename, 'w') as f:
+        f.write('(define (problem depotprob%d) (:domain Depot)\n(:objects\n' % seed)
+        f.write('\t%s - Depot\n' % ' '.join(places[:depots]))
+        f.write('\t%s - Distributor\n' % ' '.join(places[depots:]))
+        f.write('\t%s - Truck\n' % ' '.join('truck%d' % i for i in range(trucks)))
+        f.write('\t%s - Pallet\n' % ' '.join(pallet_names))
+        f.write('\t%s - Crate\n' % ' '.join('crate%d' % i for i in range(crates)))
+        f.write('\t%s - Hoist)\n' % ' '.join('hoist%d' % i for i in range(hoists)))
+        f.write('(:init\n\t%s\n)\n\n' % '\n\t'.join(init))
+        f.write('(:goal (and\n\t\t%s\n\t)\n))\n' % '\n\t\t'.join(goals))
+    return len(init)
+
+
+def benchmark_incremental(sizes=((2, 2, 2, 4, 4, 6), (3, 3, 4, 8, 8, 12), (4, 6, 6, 12, 12, 20)), walk=50,
+                          seed=0):
+    """ Times h_add from scratch against its repair from the parent's cost table over the successors met on a
+    random walk, checking that they agree; sizes are (depots, distributors, trucks, pallets, hoists, crates)
+    tuples """
+    rnd = random.Random(seed)
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        problem = os.path.join(tmp_dir, 'pfile.pddl')
+        for size in sizes:
+            generate_depots_problem(problem, *size)
+            planner = Planner('Depots.pddl', problem, grounding='reachable')
+            heuristic = planner.heuristic
+            search = ForwardSearch(planner.all_possible_actions, heuristic)
+            state = to_bitset(planner.parser.init_facts)
+            transitions = []
+            for _ in range(walk):
+                successors = [successor for _, successor in search.successors(state)]
+                if not successors:
+                    break
+                transitions.extend((state, successor) for successor in successors)
+                state = rnd.choice(successors)
+            start = time.perf_counter()
+            scratch = [heuristic.h_add(bitset_ids(successor)) for _, successor in transitions]
+            scratch_time = time.perf_counter() - start
+            tables = {parent: heuristic.cost_table(bitset_ids(parent)) for parent, _ in transitions}
+            start = time.perf_counter()
+            repaired = [heuristic.table_h_add(heuristic.repair(tables[parent], bitset_ids(successor & ~parent),
+                                                               bitset_ids(parent & ~successor)))
+                        for parent, successor in transitions]
+            repair_time = time.perf_counter() - start
+            if repaired != scratch:
+                raise Exception('Repaired h_add disagrees on ' + str(size))
+            print('h_add {}: {} evaluations, {:.1f}us from scratch, {:.1f}us repaired ({:.1f}x)'.format(
+                size, len(transitions), scratch_time * 1e6 / len(transitions), repair_time * 1e6 / len(transitions),
+                scratch_time / repair_time))
+
+
+def benchmark_search(sizes=((2, 2, 2, 3, 3, 4), (2, 2, 2, 4, 4, 6)), seed=0, cache_bytes=1 << 20):
+    """ Runs GBFS on generated problems plain, with incremental h_add and with helpful actions first, checking
+    that incremental h_add finds the same plan, then GBFS and weighted A* one after the other sharing a heuristic
+    cache of cache_bytes; sizes as in benchmark_incremental """
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        problem = os.path.join(tmp_dir, 'pfile.pddl')
+        for size in sizes:
+            generate_depots_problem(problem, *size, seed=seed)
+            planner = Planner('Depots.pddl', problem, grounding='reachable')
+            plans = {}
+            for option in ('plain', 'incremental', 'helpful'):
+                plan, statistics = planner.search(**({option: True} if option != 'plain' else {}))
+                plans[option] = plan
+                print('gbfs {} {:>11}: {} expanded, {} evaluated in {:.3f}s ({:.0f} expansions/s, '
+                      '{:.0f} evaluations/s), plan of {} actions'.format(
+                        size, option, statistics['expanded'], statistics['evaluated'], statistics['search_time'],
+                        statistics['expansions_per_second'], statistics['evaluations_per_second'],
+                        len(plan) if plan is not None else None))
+            if plans['plain'] != plans['incremental']:
+                raise Exception('Incremental search found another plan on ' + str(size))
+            cached = Planner('Depots.pddl', problem, grounding='reachable', heuristic_cache_bytes=cache_bytes)
+            for algorithm, weight in (('gbfs', 1), ('wastar', 1), ('wastar', 3)):
+                plan, statistics = cached.search(algorithm, weight)
+                if plan != planner.search(algorithm, weight)[0]:
+                    raise Exception('The heuristic cache changed the ' + algorithm + ' plan on ' + str(size))
+                print('{} {} w={} cached: {} evaluated in {:.3f}s, {hits} hits, {misses} misses, {evictions} '
+                      'evictions, {entries} entries in {bytes} bytes'.format(
+                        algorithm, size, weight, statistics['evaluated'], statistics['search_time'],
+                        **statistics['cache']))
+
+def check_equal_parameters():
+    """ Checks that an action grounding with equal parameters is only excluded when it changes nothing, by
+    planning the one place visit task in both grounding modes """
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        domain = os.path.join(tmp_dir, 'domain.pddl')
+        problem = os.path.join(tmp_dir, 'problem.pddl')
+        for filename, text in ((domain, VISIT_DOMAIN), (problem, VISIT_PROBLEM)):
+            with open(filename, 'w') as f:
+                f.write(text)
+        for mode in Grounder.MODES:
+            planner = Planner(domain, problem, grounding=mode)
+            if planner.search()[0] is None:
+                raise Exception('No plan found for the visit task with ' + mode + ' grounding')
+            print('equal parameters {:>9}: {} ground actions, plan found'.format(
+                mode, len(planner.all_possible_actions)))
+
+
+
+if __name__ == '__main__':
+    benchmarks = {
+        'equal_parameters': check_equal_parameters,
+        'incremental': benchmark_incremental,
+        'search': benchmark_search,
+    }
+    for name in sys.argv[1:] or benchmarks:
+        benchmarks[name]()
@@ -0,0 +1,197 @@
+import heapq
+import itertools
+import time
+
+from bitset import bitset_ids, to_bitset
+
+# the heuristic value of a state that is not cached, None being the value of a dead end
+_MISSING = object()
+
+
+class ForwardSearch:
+    """ Greedy best-first search and weighted A* from the init state over the ground actions, guided by a
+    RelaxedHeuristic.
+
+    A state is the int bitset of its fact ids, which is also its key in the closed list, so applicability,
+    successors and the goal test are a few bit operations. The open list is a binary heap of
+    (priority, h, insertion number, g, state) entries; an entry whose g is worse than the best one known for its
+    state, or that was already expanded with that g, is outdated and skipped when popped.
+
+    With helpful actions the successors reached through the helpful actions of the expanded state also enter a
+    second open list. The two lists are popped in turn, and the helpful one alone for HELPFUL_BOOST expansions
+    whenever a state with a new lowest h is found.
+    """
+    ALGORITHMS = ('gbfs', 'wastar')
+    HELPFUL_BOOST = 1000
+    ESTIMATES = ('add', 'max', 'ff')
+
+    def __init__(self, actions, heuristic, algorithm='gbfs', weight=1, estimate='add', incremental=False, cache=None,
+                 helpful=False):
+        """ algorithm: 'gbfs' orders the open list by h alone, 'wastar' by g + weight * h and reopens a state
+        reached again with a lower g
+        estimate: the heuristic value used, 'add', 'max' or 'ff'
+        incremental: repair the h_add of the successors from the cost table of the expanded state instead of
+        evaluating each of them from scratch
+        cache: optional HeuristicCache of the estimate's values, looked up before any evaluation
+        helpful: expand the successors reached through FF's helpful actions first
+        """
+        if algorithm not in self.ALGORITHMS:
+            raise Exception('Unknown search algorithm ' + str(algorithm))
+        if estimate not in self.ESTIMATES:
+            raise Exception('Unknown heuristic estimate ' + str(estimate))
+        if incremental and estimate != 'add':
+            raise Exception('Only the add estimate can be repaired incrementally')
+        if weight < 1:
+            raise Exception('The weighted A* weight cannot be lower than 1')
+        self.actions = actions
+        self.heuristic = heuristic
+        self.algorithm = algorithm
+        self.weight = weight
+        self.estimate = getattr(heuristic, 'h_' + estimate)
+        self.incremental = incremental
+        self.cache = cache
+        self.helpful = helpful
+        # per action: positive preconditions, negative preconditions, add and delete effects as bitsets
+        self.masks = [(to_bitset(action.positive_preconditions), to_bitset(action.negative_preconditions),
+                       to_bitset(action.add_effects), to_bitset(action.del_effects)) for action in actions]
+        # fact id -> the actions whose smallest precondition it is, so only they are tested in states holding it
+        self.first_precondition_index = {}
+        self.free_actions = []
+        for action in actions:
+            if action.positive_preconditions:
+                self.first_precondition_index.setdefault(min(action.positive_preconditions), []).append(action.id)
+            else:
+                self.free_actions.append(action.id)
+        self.expanded = 0
+        self.generated = 0
+        self.evaluated = 0
+        self.search_time = 0.0
+
+    def search(self, init_facts, positive_goals, negative_goals=()):
+        """ A list of ground actions leading from init_facts to the goals, None when the search space is
+        exhausted """
+        start = time.perf_counter()
+        try:
+            return self.__search(to_bitset(init_facts), to_bitset(positive_goals), to_bitset(negative_goals))
+        finally:
+            self.search_time += time.perf_counter() - start
+
+    def __search(self, init, goal_mask, forbidden_mask):
+        greedy = self.algorithm == 'gbfs'
+        h = self.__cached(init)
+        if h is _MISSING:
+            h = self.__evaluate(init)
+            self.__store(init, h)
+        if h is None:
+            return None
+        best = {init: (0, None, None, h)}  # state -> (best g, parent state, action id, h)
+        # the repaired cost tables of the last expanded state's successors, as greedy search mostly goes on with one
+        tables = {}
+        expanded = {}  # state -> the g it was last expanded with
+        counter = itertools.count()
+        # the open list of every successor, then with helpful actions the one of those reached through them
+        open_lists = [[(h if greedy else self.weight * h, h, next(counter), 0, init)]]
+        if self.helpful:
+            open_lists.append([])
+        lowest_h = h
+        boost = 0
+        turn = 0
+        while open_lists[0]:
+            index = 0
+            if self.helpful:
+                if boost and open_lists[1]:
+                    boost -= 1
+                    index = 1
+                else:
+                    turn = 1 - turn
+                    index = turn if open_lists[turn] else 1 - turn
+            _, _, _, g, state = heapq.heappop(open_lists[index])
+            if g > best[state][0] or expanded.get(state, g + 1) <= g:
+                continue
+            expanded[state] = g
+            if state & goal_mask == goal_mask and not state & forbidden_mask:
+                return self.__plan(best, state)
+            self.expanded += 1
+            table = tables.get(state)
+            tables = {}
+            helpful_actions = self.__helpful_actions(state) if self.helpful else ()
+            for action_id, successor in self.successors(state):
+                self.generated += 1
+                successor_g = g + 1
+                known = best.get(successor)
+                if known is None:
+                    h = self.__cached(successor)
+                    if h is _MISSING:
+                        if self.incremental:
+                            if table is None:
+                                table = self.heuristic.cost_table(bitset_ids(state))
+                            tables[successor] = self.__repair(table, state, successor)
+                            h = self.heuristic.table_h_add(tables[successor])
+                        else:
+                            h = self.__evaluate(successor)
+                        self.__store(successor, h)
+                elif greedy or known[0] <= successor_g:
+                    continue
+                else:
+                    h = known[3]
+                best[successor] = (successor_g, state, action_id, h)
+                if h is None:
+                    continue
+                entry = (h if greedy else successor_g + self.weight * h, h, next(counter), successor_g, successor)
+                heapq.heappush(open_lists[0], entry)
+                if action_id in helpful_actions:
+                    heapq.heappush(open_lists[1], entry)
+                if h < lowest_h:
+                    lowest_h = h
+                    if self.helpful:
+                        boost += self.HELPFUL_BOOST
+        return None
+
+    def successors(self, state):
+        """ (action id, successor state) for every action applicable in state """
+        masks = self.masks
+        candidates = list(self.free_actions)
+        for fact in bitset_ids(state):
+            candidates.extend(self.first_precondition_index.get(fact, ()))
+        for action_id in candidates:
+            positive, negative, adds, deletes = masks[action_id]
+            if state & positive == positive and not state & negative:
+                yield action_id, (state & ~deletes) | adds
+
+    def __evaluate(self, state):
+        self.evaluated += 1
+        return self.estimate(bitset_ids(state))
+
+    def __cached(self, state):
+        return _MISSING if self.cache is None else self.cache.get(state, _MISSING)
+
+    def __store(self, state, h):
+        if self.cache is not None:
+            self.cache.put(state, h)
+
+    def __helpful_actions(self, state):
+        self.evaluated += 1
+        return self.heuristic.h_ff_helpful(bitset_ids(state))[1]
+
+    def __repair(self, table, state, successor):
+        self.evaluated += 1
+        return self.heuristic.repair(table, bitset_ids(successor & ~state), bitset_ids(state & ~successor))
+
+    def __plan(self, best, state):
+        plan = []
+        _, parent, action_id, _ = best[state]
+        while parent is not None:
+            plan.append(self.actions[action_id])
+            _, parent, action_id, _ = best[parent]
+        plan.reverse()
+        return plan
+
+    def statistics(self):
+        """ Expanded, generated and evaluated state counts, the search time and the per second throughput """
+        seconds = self.search_time or float('inf')
+        statistics = {'expanded': self.expanded, 'generated': self.generated, 'evaluated': self.evaluated,
+                      'search_time': self.search_time, 'expansions_per_second': self.expanded / seconds,
+                      'evaluations_per_second': self.evaluated / seconds}
+        if self.cache is not None:
+            statistics['cache'] = self.cache.statistics()
+        return statistics
@@ -0,0 +1,110 @@
+class FactIndex:
+    """ Fact keys (predicate id, object id, ...) indexed by predicate and by every (predicate, position, object) """
+
+    def __init__(self, keys=()):
+        self.keys = set()
+        self.by_predicate = {}
+        self.by_argument = {}
+        for key in keys:
+            self.add(key)
+
+    def add(self, key):
+        """ Returns False when the key was already indexed """
+        if key in self.keys:
+            return False
+        self.keys.add(key)
+        self.by_predicate.setdefault(key[0], []).append(key)
+        for position, obj in enumerate(key[1:]):
+            self.by_argument.setdefault((key[0], position, obj), []).append(key)
+        return True
+
+    def candidates(self, predicate, args, binding):
+        """ The shortest indexed list holding every key that agrees with the already bound arguments.
+
+        args follows Action's compiled atoms: a parameter index or ~object_id for a constant.
+        """
+        best = self.by_predicate.get(predicate, ())
+        for position, arg in enumerate(args):
+            obj = ~arg if arg < 0 else binding[arg]
+            if obj is not None:
+                keys = self.by_argument.get((predicate, position, obj), ())
+                if len(keys) < len(best):
+                    best = keys
+        return best
+
+    def __contains__(self, key):
+        return key in self.keys
+
+    def __len__(self):
+        return len(self.keys)
+
+
+class Grounder:
+    """ Turns the parser's lifted actions into GroundActions, whose ids are their indexes in the returned list.
+
+    'full' grounds every typed combination of objects, 'reachable' first computes the relaxed reachable facts
+    (delete effects ignored) and only grounds the actions whose positive preconditions can all be met.
+    In both modes the preconditions over static predicates are joined against the :init facts, so an action
+    with an unsatisfiable static precondition is never created.
+    """
+    MODES = ('full', 'reachable')
+
+    def __init__(self, parser):
+        self.parser = parser
+        self.symbols = parser.symbols
+        self.typed_objects = {type_name: [self.symbols.object(obj) for obj in objects]
+                              for type_name, objects in parser.objects.items()}
+
+    def ground(self, mode='full'):
+        if mode == 'full':
+            return self.ground_all()
+        if mode == 'reachable':
+            return self.ground_reachable()
+        raise Exception('Grounding mode ' + str(mode) + ' not supported')
+
+    def static_predicates(self):
+        """ Ids of the predicates that no action adds or deletes, so their facts are fixed by :init """
+        changing = set()
+        for action in self.parser.actions:
+            for pred in action.positive_preconditions + action.negative_preconditions:
+                self.symbols.predicate(pred[0])
+            for pred in action.add_effects + action.del_effects:
+                changing.add(self.symbols.predicate(pred[0]))
+        return set(range(len(self.symbols.predicate_names))) - changing
+
+    def ground_all(self):
+        static = self.static_predicates()
+        static_index = FactIndex(key for key in self.__init_keys() if key[0] in static)
+        ground_actions = []
+        for action in self.parser.actions:
+            for assignment in action.assignments(self.typed_objects, self.symbols, static_index, static, static):
+                ground_actions.append(action.ground(assignment, self.symbols, len(ground_actions)))
+        return ground_actions
+
+    def ground_reachable(self):
+        """ Grounds round by round, semi-naively: after the first round, which joins the :init facts, a round only
+        joins the assignments that need a fact added by the round before, so no assignment is joined twice """
+        static = self.static_predicates()
+        all_predicates = set(range(len(self.symbols.predicate_names)))
+        # static facts never change, so the negative static preconditions can be checked against the reached ones
+        reached = FactIndex(self.__init_keys())
+        new_facts = None
+        ground_actions = []
+        while new_facts is None or new_facts:
+            added = FactIndex()
+            for action in self.parser.actions:
+                for assignment in action.assignments(self.typed_objects, self.symbols, reached, all_predicates,
+                                                     static, new_facts):
+                    ground_action = action.ground(assignment, self.symbols, len(ground_actions))
+                    ground_actions.append(ground_action)
+                    for fact in ground_action.add_effects:
+                        key = self.symbols.fact_keys[fact]
+                        if key not in reached:
+                            added.add(key)
+            for key in added.keys:
+                reached.add(key)
+            new_facts = added
+        return ground_actions
+
+    def __init_keys(self):
+        return [self.symbols.fact_keys[fact] for fact in self.parser.init_facts]
@@ -0,0 +1,61 @@
+import sys
+from collections import OrderedDict
+
+
+class HeuristicCache:
+    """ Heuristic values keyed by a canonical state encoding, the int bitset of the state's fact ids, whatever
+    path reached the state.
+
+    The size of an entry is estimated as the size of its key plus ENTRY_OVERHEAD; once the entries pass
+    max_bytes the least recently used ones are evicted.
+    """
+    ENTRY_OVERHEAD = 120  # bytes of the ordered dict node, its hash slot and a small int value
+
+    def __init__(self, max_bytes):
+        if max_bytes <= 0:
+            raise Exception('The heuristic cache needs a positive memory bound')
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, state, default=None):
+        """ The cached value of state, default when it is not cached (dead ends are cached as None) """
+        value = self.entries.get(state, default)
+        if value is default and state not in self.entries:
+            self.misses += 1
+            return default
+        self.hits += 1
+        self.entries.move_to_end(state)
+        return value
+
+    def put(self, state, value):
+        if state in self.entries:
+            self.entries[state] = value
+            self.entries.move_to_end(state)
+            return
+        self.entries[state] = value
+        self.bytes += self.__entry_size(state)
+        while self.bytes > self.max_bytes and self.entries:
+            evicted, _ = self.entries.popitem(last=False)
+            self.bytes -= self.__entry_size(evicted)
+            self.evictions += 1
+
+    def clear(self):
+        self.entries.clear()
+        self.bytes = 0
+
+    def statistics(self):
+        """ Hit, miss and eviction counts, the hit rate and the current and maximum entry sizes """
+        lookups = self.hits + self.misses
+        return {'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions,
+                'hit_rate': self.hits / lookups if lookups else 0.0, 'entries': len(self.entries),
+                'bytes': self.bytes, 'max_bytes': self.max_bytes}
+
+    def __entry_size(self, state):
+        return sys.getsizeof(state) + self.ENTRY_OVERHEAD
+
+    def __len__(self):
+        return len(self.entries)
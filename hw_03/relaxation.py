@@ -1,32 +1,57 @@
+from forward_search import ForwardSearch
+from grounder import Grounder
+from heuristic_cache import HeuristicCache
 from pddl_parser import PddlParser
-import copy
+from relaxed_heuristic import RelaxedHeuristic
+from task_cache import TaskCache
+
 
 class Planner:
-    def __init__(self, domain_file_name, problem_file_name):
-        # Parser
-        self.parser = PddlParser()
-        self.parser.parse_domain(domain_file_name)
-        self.parser.parse_problem(problem_file_name)
-        self.action_state = {}  # An
+    def __init__(self, domain_file_name, problem_file_name, cache_dir=None, grounding='full',
+                 heuristic_cache_bytes=None):
+        """ cache_dir: optional directory where parsed and grounded tasks are stored and reused between runs
+        grounding: 'full' grounds every typed object combination, 'reachable' only the relaxed reachable actions
+        heuristic_cache_bytes: optional memory bound of the LRU caches that keep the heuristic values of the states
+        met by search() across its calls, one cache per estimate
+        """
+        self.action_state = {}  # An, every level maps its applicable actions to their Hadd value
         self.all_possible_actions = []
-        self.generate_all_available_actions()
-        self.states = {0: set(tuple(state + [0]) for state in self.parser.state)}
+        cache = TaskCache(cache_dir) if cache_dir else None
+        cache_key = None
+        cached_task = None
+        if cache:
+            cache_key = cache.key(domain_file_name, problem_file_name, grounding)
+            cached_task = cache.load(cache_key)
+        if cached_task:
+            self.parser, self.all_possible_actions = cached_task
+        else:
+            # Parser
+            self.parser = PddlParser()
+            self.parser.parse_domain(domain_file_name)
+            self.parser.parse_problem(problem_file_name)
+            self.generate_all_available_actions(grounding)
+            if cache:
+                cache.store(cache_key, self.parser, self.all_possible_actions)
+        # every level maps each reached fact id to its Hadd value
+        self.states = {0: {fact: 0 for fact in self.parser.init_facts}}
         self.g_node = 0
+        self.heuristic = RelaxedHeuristic(self.all_possible_actions, len(self.parser.symbols),
+                                          self.parser.positive_goal_facts)
+        self.heuristic_cache_bytes = heuristic_cache_bytes
+        self.heuristic_caches = {}  # estimate -> HeuristicCache
 
-    def generate_all_available_actions(self):
-        for action in self.parser.actions:
-            for possible_act in action.groundify(self.parser.objects):
-                self.all_possible_actions.append(possible_act)
+    def generate_all_available_actions(self, grounding='full'):
+        self.all_possible_actions = Grounder(self.parser).ground(grounding)
 
     @staticmethod
     def applicable(state, precondition):
-        return any([set(precondition).issubset(set(item)) for item in state])
+        return precondition in state
 
     def relaxation_plan(self):
         current_state = 0  # S0
         while True:
-            temp_state = self.states[current_state].copy()
-            possible_actions = set()
+            temp_state = dict(self.states[current_state])
+            possible_actions = {}
             for action in self.all_possible_actions:
                 action_flag = True
                 pre_cond = action.positive_preconditions
@@ -35,24 +60,12 @@ class Planner:
                         action_flag = False
                         break
                 if action_flag:
-                    for precondition in pre_cond:
-                        # find the precondition in temp_state
-                        state_from_temp_state = \
-                            [item for item in temp_state if set(precondition).issubset(set(item))][0]
-                        action.weight += state_from_temp_state[len(state_from_temp_state) - 1]
-                    action.weight += 1
-
+                    action_cost = sum(temp_state[precondition] for precondition in pre_cond) + 1
                     for effect in action.add_effects:
-                        # check effect exists already in state
-                        if any([set(effect).issubset(set(item)) for item in temp_state]):
-                            state_from_temp_state = [item for item in temp_state if set(effect).issubset(set(item))][0]
-                            if state_from_temp_state[len(state_from_temp_state) - 1] > action.weight:
-                                temp_state.remove(state_from_temp_state)
-                                temp_state.add(state_from_temp_state[:len(state_from_temp_state) - 1] +
-                                               (action.weight,))
-                        else:
-                            temp_state.add(effect + (action.weight,))
-                    possible_actions.add(copy.deepcopy(action))
+                        # keep the cheapest way found to reach the effect
+                        if effect not in temp_state or temp_state[effect] > action_cost:
+                            temp_state[effect] = action_cost
+                    possible_actions[action] = action_cost
 
             if temp_state == self.states[current_state] or len(possible_actions) == 0:
                 break
@@ -66,31 +79,84 @@ class Planner:
             print("I could not succeed all goals")
         self.write_actions_states_occurred(current_state)
 
+    def relaxed_plan(self):
+        """ FF's relaxed plan over the levels of relaxation_plan: from the last level back, every goal first held
+        at a level is supported by the cheapest action of the level before it adding the goal, and the supporter's
+        preconditions become goals of the levels they are first held at. Returns the plan's actions and the
+        helpful actions, those of level 0 adding a goal of level 1; None and an empty set when a goal was never
+        reached """
+        first_level = {}
+        for level in range(len(self.states)):
+            for fact in self.states[level]:
+                first_level.setdefault(fact, level)
+        goals = {}  # level -> the goals first held at it
+        for goal in self.parser.positive_goal_facts:
+            if goal not in first_level:
+                return None, set()
+            goals.setdefault(first_level[goal], set()).add(goal)
+        plan = []
+        for level in range(len(self.states) - 1, 0, -1):
+            if not goals.get(level):
+                continue
+            # fact -> the cheapest action of the level before adding it
+            supporters = {}
+            for action, action_cost in self.action_state[level - 1].items():
+                for effect in action.add_effects:
+                    if effect not in supporters or action_cost < supporters[effect][1]:
+                        supporters[effect] = (action, action_cost)
+            achieved = set()
+            for goal in sorted(goals[level]):
+                if goal in achieved:
+                    continue
+                action = supporters[goal][0]
+                plan.append(action)
+                achieved.update(action.add_effects)
+                for precondition in action.positive_preconditions:
+                    if first_level[precondition] > 0:
+                        goals.setdefault(first_level[precondition], set()).add(precondition)
+        plan.reverse()
+        helpful = set(action for action in self.action_state.get(0, ())
+                      if not action.add_set.isdisjoint(goals.get(1, ())))
+        return plan, helpful
+
+    def search(self, algorithm='gbfs', weight=1, estimate='add', incremental=False, helpful=False):
+        """ Forward search from the init facts to the goals guided by the relaxation, see ForwardSearch.
+        Returns the plan (a list of ground actions, None when there is none) and the search statistics """
+        cache = None
+        if self.heuristic_cache_bytes:
+            if estimate not in self.heuristic_caches:
+                self.heuristic_caches[estimate] = HeuristicCache(self.heuristic_cache_bytes)
+            cache = self.heuristic_caches[estimate]
+        search = ForwardSearch(self.all_possible_actions, self.heuristic, algorithm, weight, estimate, incremental,
+                               cache, helpful)
+        plan = search.search(self.parser.init_facts, self.parser.positive_goal_facts, self.parser.negative_goal_facts)
+        return plan, search.statistics()
+
     def calculate_g_node(self, current_state):
-        succeeded_goals = ([item for goal in self.parser.positive_goals for item in self.states[current_state] if
-                            set(goal).issubset(set(item))])
-        if len(self.parser.positive_goals) == len(succeeded_goals) and self.g_node == 0:
-            for _succeeded_goal in succeeded_goals:
-                self.g_node += _succeeded_goal[len(_succeeded_goal) - 1]
+        state = self.states[current_state]
+        if self.g_node == 0 and all(goal in state for goal in self.parser.positive_goal_facts):
+            for goal in self.parser.positive_goal_facts:
+                self.g_node += state[goal]
 
     def write_actions_states_occurred(self, current_state):
+        symbols = self.parser.symbols
         data = 'Actions and States occurred per level \n' + '-' * 50 + '\n'
         for level in range(current_state):
             data += 'At level {} we had {} states and we found {} new actions\n'.format(
                 level, len(self.states[level]), len(self.action_state[level]))
             data += '\nStates: \n'
-            for state in self.states[level]:
-                data += "%s - Hadd value: %d \n" % (', '.join(state[:len(state) - 1]), state[len(state) - 1])
+            for fact, cost in self.states[level].items():
+                data += "%s - Hadd value: %d \n" % (', '.join(symbols.fact_name(fact)), cost)
             data += '\nActions: \n'
-            for action in self.action_state[level]:
-                data += action.__str__()
+            for action, action_cost in self.action_state[level].items():
+                data += action.describe(symbols, action_cost)
             data += '-' * 100 + '\n'
 
         # write last level's states
         data += 'At level {} we had {} states\n'.format(current_state, len(self.states[current_state]))
         data += '\nStates: \n'
-        for state in self.states[current_state]:
-            data += "%s - Hadd value: %d \n" % (', '.join(state[:len(state) - 1]), state[len(state) - 1])
+        for fact, cost in self.states[current_state].items():
+            data += "%s - Hadd value: %d \n" % (', '.join(symbols.fact_name(fact)), cost)
 
         data += '\n' + '-' * 100 + '\n'
         if self.g_node == 0:
@@ -107,3 +173,21 @@ if __name__ == '__main__':
     problem = "pfile1.pddl"
     planner = Planner(domain, problem)
     planner.relaxation_plan()
+    init_facts = planner.parser.init_facts
+    relaxed_plan, helpful_actions = planner.relaxed_plan()
+    if relaxed_plan is not None:
+        print('FF relaxed plan length = {}, helpful actions: {}'.format(len(relaxed_plan), ', '.join(
+            '{}({})'.format(action.name, ', '.join(planner.parser.symbols.object_name(obj)
+                                                   for obj in action.parameters)) for action in helpful_actions)))
+    print('h_add = {}, h_max = {}, h_FF = {}'.format(planner.heuristic.h_add(init_facts),
+                                                     planner.heuristic.h_max(init_facts),
+                                                     planner.heuristic.h_ff(init_facts)))
+    plan, statistics = planner.search()
+    if plan is None:
+        print('No plan found')
+    else:
+        for step, action in enumerate(plan):
+            print('Step {}: {}({})'.format(step, action.name, ', '.join(
+                planner.parser.symbols.object_name(obj) for obj in action.parameters)))
+    print('Expanded {expanded} states ({expansions_per_second:.0f}/s), evaluated {evaluated} '
+          '({evaluations_per_second:.0f}/s) in {search_time:.2f}s'.format(**statistics))
@@ -0,0 +1,230 @@
+import heapq
+
+
+class RelaxedHeuristic:
+    """ h_add, h_max and h_FF of a state (fact ids) over the delete relaxation, every action costing 1.
+
+    One evaluation is a generalized Dijkstra pass: facts leave a heap in order of cost and every action keeps a
+    counter of its preconditions not reached yet, so it fires exactly once, when the last one is reached. The
+    action costs, counters and best supporters live in flat lists indexed by action and fact id that are copied
+    from templates at the start of a pass; the ground actions themselves are never touched.
+
+    A successor state differs from its parent by a few facts, so its h_add can also be repaired from the parent's
+    cost table: only the facts whose best supporters depend on a deleted fact are recomputed, and the costs
+    lowered by the added facts are propagated from them.
+    """
+
+    def __init__(self, actions, fact_count, goals):
+        self.actions = actions
+        self.goals = list(goals)
+        self.goal_set = frozenset(goals)
+        self.preconditions = [tuple(action.pre_set) for action in actions]
+        self.adds = [action.add_effects for action in actions]
+        self.requirers = [[] for _ in range(fact_count)]  # fact id -> ids of the actions it is a precondition of
+        self.adders = [[] for _ in range(fact_count)]  # fact id -> ids of the actions adding it
+        for action in actions:
+            for fact in action.pre_set:
+                self.requirers[fact].append(action.id)
+            for fact in action.add_set:
+                self.adders[fact].append(action.id)
+        self.free_actions = [action.id for action in actions if not action.pre_set]
+        self.__unsatisfied = [len(preconditions) for preconditions in self.preconditions]
+        self.__zeros = [0] * len(actions)
+        self.__unreached = [None] * fact_count
+        self.evaluations = 0
+        # fact costs and best supporters (action ids, None for the facts of the state) of the last pass
+        self.cost = None
+        self.supporter = None
+
+    def h_add(self, state):
+        """ Sum of the goal costs when every action costs its preconditions' sum plus 1, None for a dead end """
+        return self.__goal_cost(self.__explore(state, True), sum)
+
+    def h_max(self, state):
+        """ The costliest goal when every action costs its costliest precondition plus 1, None for a dead end """
+        return self.__goal_cost(self.__explore(state, False), max)
+
+    def h_ff(self, state):
+        """ Length of the relaxed plan over the h_add best supporters, None for a dead end """
+        plan = self.relaxed_plan(state)
+        return None if plan is None else len(plan)
+
+    def relaxed_plan(self, state):
+        """ The ids of the actions that support the goals, and their preconditions in turn, in a cheapest way
+        found by the h_add pass; None when a goal is unreachable """
+        if not self.__explore(state, True):
+            return None
+        return self.__relaxed_plan()[0]
+
+    def h_ff_helpful(self, state):
+        """ h_FF and the helpful actions of state: the ids of the actions applicable in the relaxation of state
+        that add a fact the relaxed plan needs after its first step (the goals of its layer 1 in FF). h_FF is None
+        and the set empty for a dead end """
+        if not self.__explore(state, True):
+            return None, set()
+        plan, subgoals = self.__relaxed_plan()
+        cost = self.cost
+        helpful = set()
+        for fact in subgoals:
+            if cost[fact] == 1:
+                helpful.update(action_id for action_id in self.adders[fact]
+                               if all(cost[precondition] == 0 for precondition in self.preconditions[action_id]))
+        return len(plan), helpful
+
+    def __relaxed_plan(self):
+        """ The relaxed plan over the supporters of the last h_add pass and the facts it achieves """
+        supporter = self.supporter
+        plan = set()
+        subgoals = set()
+        reached = set()
+        open_facts = list(self.goals)
+        while open_facts:
+            fact = open_facts.pop()
+            if fact in reached:
+                continue
+            reached.add(fact)
+            action_id = supporter[fact]
+            if action_id is not None:
+                subgoals.add(fact)
+                if action_id not in plan:
+                    plan.add(action_id)
+                    open_facts.extend(self.preconditions[action_id])
+        return plan, subgoals
+
+    def cost_table(self, state):
+        """ The h_add cost (None when unreachable) and best supporter of every fact from state, to repair the
+        tables of its successors from """
+        self.__explore(state, True, False)
+        return self.cost, self.supporter
+
+    def repair(self, table, added, deleted):
+        """ The cost table of the state whose table is given once the facts added are added to it and the facts
+        deleted removed, as cost_table would compute it """
+        self.evaluations += 1
+        costs, supporters = table
+        cost = list(costs)
+        supporter = list(supporters)
+        preconditions = self.preconditions
+        adds = self.adds
+        requirers = self.requirers
+        # the facts whose cost may rise: the deleted ones and the facts supported through them
+        affected = set()
+        open_facts = list(deleted)
+        while open_facts:
+            fact = open_facts.pop()
+            if fact in affected:
+                continue
+            affected.add(fact)
+            for action_id in requirers[fact]:
+                for added_fact in adds[action_id]:
+                    if supporter[added_fact] == action_id and added_fact not in affected:
+                        open_facts.append(added_fact)
+        for fact in affected:
+            cost[fact] = None
+            supporter[fact] = None
+        heap = []
+        for fact in affected:
+            for action_id in self.adders[fact]:
+                action_cost = 1
+                for precondition in preconditions[action_id]:
+                    precondition_cost = cost[precondition]
+                    if precondition_cost is None:
+                        break
+                    action_cost += precondition_cost
+                else:
+                    if cost[fact] is None or action_cost < cost[fact]:
+                        cost[fact] = action_cost
+                        supporter[fact] = action_id
+            if cost[fact] is not None:
+                heap.append((cost[fact], fact))
+        for fact in added:
+            if cost[fact] != 0:
+                cost[fact] = 0
+                supporter[fact] = None
+                heap.append((0, fact))
+        heapq.heapify(heap)
+        heappop = heapq.heappop
+        heappush = heapq.heappush
+        # only lowered costs are left to propagate, every fact leaving the heap has its final cost
+        while heap:
+            fact_cost, fact = heappop(heap)
+            if fact_cost > cost[fact]:
+                continue
+            for action_id in requirers[fact]:
+                action_cost = 1
+                for precondition in preconditions[action_id]:
+                    precondition_cost = cost[precondition]
+                    if precondition_cost is None:
+                        break
+                    action_cost += precondition_cost
+                else:
+                    for added_fact in adds[action_id]:
+                        old_cost = cost[added_fact]
+                        if old_cost is None or action_cost < old_cost:
+                            cost[added_fact] = action_cost
+                            supporter[added_fact] = action_id
+                            heappush(heap, (action_cost, added_fact))
+        return cost, supporter
+
+    def table_h_add(self, table):
+        """ h_add of the state a cost table was computed or repaired for """
+        cost = table[0]
+        if any(cost[goal] is None for goal in self.goals):
+            return None
+        return sum(cost[goal] for goal in self.goals)
+
+    def __goal_cost(self, reached, combine):
+        if not reached:
+            return None
+        return combine([self.cost[goal] for goal in self.goals]) if self.goals else 0
+
+    def __explore(self, state, additive, stop_at_goals=True):
+        """ Fills self.cost and self.supporter from state, stopping once every goal has its final cost unless
+        stop_at_goals is False; returns False when some goal cannot be reached """
+        self.evaluations += 1
+        cost = self.__unreached[:]
+        supporter = self.__unreached[:]
+        self.cost = cost
+        self.supporter = supporter
+        unsatisfied = self.__unsatisfied[:]
+        action_cost = self.__zeros[:] if additive else None
+        requirers = self.requirers
+        adds = self.adds
+        goals_left = len(self.goal_set)
+        goal_set = self.goal_set if stop_at_goals else ()
+        heap = []
+        for fact in state:
+            if cost[fact] is None:
+                cost[fact] = 0
+                heap.append((0, fact))
+        for action_id in self.free_actions:
+            for fact in adds[action_id]:
+                if cost[fact] is None:
+                    cost[fact] = 1
+                    supporter[fact] = action_id
+                    heap.append((1, fact))
+        heapq.heapify(heap)
+        heappop = heapq.heappop
+        heappush = heapq.heappush
+        while heap and (goals_left or not stop_at_goals):
+            fact_cost, fact = heappop(heap)
+            if fact_cost > cost[fact]:
+                continue  # an outdated entry, the fact left the heap with a lower cost
+            if fact in goal_set:
+                goals_left -= 1
+            for action_id in requirers[fact]:
+                if additive:
+                    action_cost[action_id] += fact_cost
+                unsatisfied[action_id] -= 1
+                if unsatisfied[action_id] == 0:
+                    # facts leave in cost order, so for h_max the last precondition is the costliest one
+                    new_cost = (action_cost[action_id] if additive else fact_cost) + 1
+                    for added in adds[action_id]:
+                        old_cost = cost[added]
+                        if old_cost is None or new_cost < old_cost:
+                            cost[added] = new_cost
+                            supporter[added] = action_id
+                            heappush(heap, (new_cost, added))
+        if not stop_at_goals:
+            return all(cost[goal] is not None for goal in self.goals)
+        return goals_left == 0
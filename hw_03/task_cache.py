@@ -0,0 +1,43 @@
+import hashlib
+import os
+import pickle
+
+# Bump whenever the pickled parser/action layout changes so stale entries are ignored
+CACHE_VERSION = 8
+# The homework whose parser and actions the entries hold, so both homeworks can share one cache directory
+CACHE_NAMESPACE = 'hw_03'
+
+
+class TaskCache:
+    """ On-disk cache of parsed and grounded tasks, keyed by the content hash of the domain and problem files """
+
+    def __init__(self, cache_dir):
+        self.cache_dir = cache_dir
+        os.makedirs(cache_dir, exist_ok=True)
+
+    @staticmethod
+    def key(domain_filename, problem_filename, *options):
+        digest = hashlib.sha256(('%s v%d %r' % (CACHE_NAMESPACE, CACHE_VERSION, options)).encode())
+        for filename in (domain_filename, problem_filename):
+            with open(filename, 'rb') as f:
+                digest.update(hashlib.sha256(f.read()).digest())
+        return digest.hexdigest()
+
+    def load(self, key):
+        """ Returns the cached (parser, ground actions) pair or None on a miss """
+        try:
+            with open(self.__path(key), 'rb') as f:
+                return pickle.load(f)
+        except (OSError, EOFError, pickle.UnpicklingError):
+            return None
+
+    def store(self, key, parser, actions):
+        path = self.__path(key)
+        tmp_path = '%s.%d.tmp' % (path, os.getpid())
+        with open(tmp_path, 'wb') as f:
+            pickle.dump((parser, actions), f, protocol=pickle.HIGHEST_PROTOCOL)
+        # atomic rename, so concurrent runs never read a half written entry
+        os.replace(tmp_path, path)
+
+    def __path(self, key):
+        return os.path.join(self.cache_dir, key + '.pkl')